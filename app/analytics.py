@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app import config, database, models, versioning
+
+# pyarrow (and duckdb, when installed) are imported on first use so they stay
+# off the API's cold-start path.
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNS = ("id", "title", "amount", "category", "date")
+VIEWS = ("expenses", "range", "monthly", "weekly", "category", "daily")
+BATCH_SIZE = 50_000
+SNAPSHOT_ROW_GROUP = 128_000
+VERSION_KEY = b"data_version"
+
+def schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()),
+        ("title", pa.string()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+        ("date", pa.date32()),
+    ])
+
+def snapshot_path(user_id):
+    return Path(config.ANALYTICS_DIR) / f"user-{user_id}.parquet"
+
+def _statement(user_id, start=None, end=None, ordered=False):
+    stmt = select(*(getattr(models.Expense, c) for c in COLUMNS)).where(models.Expense.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(models.Expense.date >= start)
+    if end is not None:
+        stmt = stmt.where(models.Expense.date <= end)
+    return stmt.order_by(models.Expense.date, models.Expense.id) if ordered else stmt
+
+def _to_batch(rows, arrow_schema):
+    import pyarrow as pa
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, arrow_schema)],
+        schema=arrow_schema,
+    )
+
+async def record_batches(db: AsyncSession, stmt, batch_size=BATCH_SIZE, arrow_schema=None):
+    # Plain column tuples straight off the cursor; no ORM objects or dicts.
+    arrow_schema = arrow_schema or schema()
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield await run_in_threadpool(_to_batch, rows, arrow_schema)
+
+def _parse_csv(data, arrow_schema):
+    import pyarrow as pa
+    import pyarrow.csv as pcsv
+    return pcsv.read_csv(
+        pa.BufferReader(data),
+        read_options=pcsv.ReadOptions(column_names=arrow_schema.names),
+        # COPY writes NULL unquoted and empty strings quoted.
+        convert_options=pcsv.ConvertOptions(
+            column_types=arrow_schema, strings_can_be_null=True, quoted_strings_can_be_null=False,
+        ),
+    )
+
+async def _copy_table(db: AsyncSession, stmt, arrow_schema=None):
+    # COPY skips per-row protocol decoding and Row objects entirely; pyarrow
+    # parses the CSV stream in native code.
+    conn = await db.connection()
+    raw = (await conn.get_raw_connection()).driver_connection
+    query = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    chunks = []
+
+    async def collect(chunk):
+        chunks.append(chunk)
+
+    await raw.copy_from_query(query, output=collect, format="csv")
+    return await run_in_threadpool(_parse_csv, b"".join(chunks), arrow_schema or schema())
+
+async def query_table(db: AsyncSession, stmt, arrow_schema=None):
+    import pyarrow as pa
+    if database.dialect_name(db) == "postgresql":
+        return await _copy_table(db, stmt, arrow_schema)
+    batches = [batch async for batch in record_batches(db, stmt, arrow_schema=arrow_schema)]
+    return pa.Table.from_batches(batches, schema=arrow_schema or schema())
+
+async def fetch_table(db: AsyncSession, user_id, start=None, end=None, ordered=False):
+    return await query_table(db, _statement(user_id, start, end, ordered))
+
+def snapshot_version(path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    version = metadata.get(VERSION_KEY)
+    return int(version) if version is not None else None
+
+async def write_snapshot(db: AsyncSession, user_id, force=False):
+    import pyarrow.parquet as pq
+    # Read the version before the rows: if a write lands in between, the
+    # snapshot is labelled older than its data and is simply never used.
+    version, _ = await versioning.current(db, user_id)
+    path = snapshot_path(user_id)
+    if not force and snapshot_version(path) == version:
+        return None
+    # Sorted by date so row-group statistics let range reads skip most of the file.
+    table = await fetch_table(db, user_id, ordered=True)
+    table = table.replace_schema_metadata({VERSION_KEY: str(version).encode()})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix=".parquet")
+    os.close(fd)
+    try:
+        await run_in_threadpool(pq.write_table, table, tmp, compression="zstd", row_group_size=SNAPSHOT_ROW_GROUP)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return {"user_id": user_id, "version": version, "rows": table.num_rows, "path": str(path)}
+
+def _read_snapshot(path, start=None, end=None):
+    import pyarrow.parquet as pq
+    filters = []
+    if start is not None:
+        filters.append(("date", ">=", start))
+    if end is not None:
+        filters.append(("date", "<=", end))
+    return pq.read_table(path, filters=filters or None, memory_map=True)
+
+async def load_table(db: AsyncSession, user_id, start=None, end=None):
+    version, _ = await versioning.current(db, user_id)
+    path = snapshot_path(user_id)
+    if snapshot_version(path) == version:
+        return await run_in_threadpool(_read_snapshot, path, start, end)
+    return await fetch_table(db, user_id, start, end)
+
+def _aggregate_arrow(table, view):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    def grouped(source, key, sort):
+        result = source.group_by(key).aggregate([("amount", "sum"), ("amount", "count")])
+        return pa.table({
+            key: result[key],
+            "total": pc.round(result["amount_sum"], 2),
+            "count": result["amount_count"],
+        }).sort_by(sort)
+
+    if view == "range":
+        return pa.table({
+            "start": [pc.min(table["date"]).as_py()],
+            "end": [pc.max(table["date"]).as_py()],
+            "total": [round(pc.sum(table["amount"]).as_py() or 0.0, 2)],
+            "count": [table.num_rows],
+        }, schema=pa.schema([("start", pa.date32()), ("end", pa.date32()), ("total", pa.float64()), ("count", pa.int64())]))
+    # Group on integer keys and only format the few resulting labels;
+    # strftime over every row costs more than the aggregation itself.
+    if view == "monthly":
+        key = pc.add(pc.multiply(pc.year(table["date"]), 100), pc.month(table["date"]))
+        months = grouped(table.append_column("key", key), "key", "key")
+        labels = [f"{k // 100}-{k % 100:02d}" for k in months["key"].to_pylist()]
+        return months.set_column(0, "month", pa.array(labels, pa.string()))
+    if view == "weekly":
+        key = pc.add(pc.multiply(pc.iso_year(table["date"]), 100), pc.iso_week(table["date"]))
+        weeks = grouped(table.append_column("key", key), "key", "key")
+        labels = [f"{k // 100}-W{k % 100:02d}" for k in weeks["key"].to_pylist()]
+        return weeks.set_column(0, "week", pa.array(labels, pa.string()))
+    if view == "category":
+        return grouped(table, "category", [("total", "descending")])
+    if view == "daily":
+        days = grouped(table, "date", "date")
+        return days.append_column("cumulative", pc.round(pc.cumulative_sum(days["total"]), 2))
+    return table
+
+DUCKDB_QUERIES = {
+    "range": "SELECT min(date) AS start, max(date) AS \"end\", round(coalesce(sum(amount), 0), 2) AS total, "
+             "count(*) AS count FROM expenses",
+    "monthly": "SELECT strftime(date, '%Y-%m') AS month, round(sum(amount), 2) AS total, count(*) AS count "
+               "FROM expenses GROUP BY 1 ORDER BY 1",
+    "weekly": "SELECT strftime(date, '%G-W%V') AS week, round(sum(amount), 2) AS total, count(*) AS count "
+              "FROM expenses GROUP BY 1 ORDER BY 1",
+    "category": "SELECT category, round(sum(amount), 2) AS total, count(*) AS count "
+                "FROM expenses GROUP BY 1 ORDER BY sum(amount) DESC",
+    "daily": "SELECT date, round(total, 2) AS total, count, round(sum(total) OVER (ORDER BY date), 2) AS cumulative "
+             "FROM (SELECT date, sum(amount) AS total, count(*) AS count FROM expenses GROUP BY 1) ORDER BY date",
+}
+
+def _aggregate_duckdb(table, view):
+    import duckdb
+    if view not in DUCKDB_QUERIES:
+        return table
+    with duckdb.connect() as con:
+        con.register("expenses", table)
+        return con.execute(DUCKDB_QUERIES[view]).fetch_arrow_table()
+
+def engine_name():
+    if config.ANALYTICS_ENGINE != "auto":
+        return config.ANALYTICS_ENGINE
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return "arrow"
+    return "duckdb"
+
+def aggregate(table, view):
+    if engine_name() == "duckdb":
+        return _aggregate_duckdb(table, view)
+    return _aggregate_arrow(table, view)
+
+def to_ipc(table):
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    # A view over the Arrow buffer, so the response body isn't copied again.
+    return memoryview(sink.getvalue())
+
+def to_records(table, view):
+    # Arrow's round() can land one ulp off the double Python picks, which
+    # would show up in JSON as 25234.309999999998.
+    records = [
+        {k: round(v, 2) if isinstance(v, float) else v for k, v in row.items()}
+        for row in table.to_pylist()
+    ]
+    return records[0] if view == "range" else records
+
+async def changed_users(db: AsyncSession, since=None):
+    stmt = select(models.DataVersion.user_id)
+    if since is not None:
+        stmt = stmt.where(models.DataVersion.updated_at >= since)
+    return (await db.scalars(stmt.order_by(models.DataVersion.user_id))).all()
+
+async def compact(db: AsyncSession, since=None, force=False):
+    written = []
+    for user_id in await changed_users(db, since):
+        result = await write_snapshot(db, user_id, force=force)
+        if result is not None:
+            written.append(result)
+    return written
+
+async def compact_periodically(interval=None):
+    interval = interval or config.ANALYTICS_SNAPSHOT_SECONDS
+    since = None
+    while True:
+        await asyncio.sleep(interval)
+        # Only users whose data changed since the last pass need a new snapshot.
+        started = datetime.utcnow()
+        try:
+            async with database.AsyncSessionLocal() as db:
+                await compact(db, since)
+            since = started
+        except Exception:
+            # Reads fall back to the database until the next successful run.
+            continue
+
+async def _run(user_id, force):
+    try:
+        async with database.AsyncSessionLocal() as db:
+            if user_id is None:
+                written = await compact(db, force=force)
+            else:
+                written = [r for r in [await write_snapshot(db, user_id, force=force)] if r]
+    finally:
+        await database.async_engine.dispose()
+    for result in written:
+        print(f"Wrote {result['rows']} rows for user {result['user_id']} at data version {result['version']}")
+    if not written:
+        print("Snapshots are already current")
+    return 0
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.analytics", description="Write Parquet snapshots of expenses")
+    parser.add_argument("command", choices=("snapshot",))
+    parser.add_argument("--user", type=int, help="only this user (default: every user with data)")
+    parser.add_argument("--force", action="store_true", help="rewrite snapshots that are already current")
+    args = parser.parse_args(argv)
+    return asyncio.run(_run(args.user, args.force))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
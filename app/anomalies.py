@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import re
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import and_, delete, insert, null, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app import config, database, models
+
+DUPLICATE = "duplicate"
+OUTLIER = "outlier"
+KINDS = (DUPLICATE, OUTLIER)
+# Floor on the spread of log amounts (about 10%), so a category of identical
+# subscription charges doesn't flag every small price change.
+MIN_LOG_STD = 0.1
+FLAG_CHUNK = 50_000
+# Keeps each IN list well under the drivers' bind-parameter limits.
+DELETE_CHUNK = 10_000
+NON_WORD = r"[^a-z0-9]+"
+EPOCH_ORDINAL = 719163
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_non_word = re.compile(NON_WORD)
+
+def normalise(title):
+    return _non_word.sub(" ", (title or "").lower()).strip()
+
+def _codes(values):
+    codes = {}
+    return np.fromiter((codes.setdefault(v, len(codes)) for v in values), dtype=np.int64, count=len(values))
+
+def _mix(*columns):
+    # One 64-bit hash per row over several integer columns, computed column-wise.
+    h = np.zeros(len(columns[0]), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in columns:
+            h = (h ^ column.astype(np.uint64)) * _MIX
+            h ^= h >> np.uint64(31)
+    return h.view(np.int64)
+
+# A frame is (ids, user_ids, title codes, amounts, category codes, day
+# ordinals) as NumPy arrays. Codes are only comparable within one frame.
+
+def frame_from_rows(rows):
+    ids, user_ids, titles, amounts, categories, dates = zip(*rows)
+    return (np.array(ids, dtype=np.int64), np.array(user_ids, dtype=np.int64),
+            _codes([normalise(t) for t in titles]), np.array(amounts, dtype=np.float64),
+            _codes([c or "" for c in categories]),
+            np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates)))
+
+def frame_from_table(table):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    def codes(column):
+        encoded = pc.dictionary_encode(pc.fill_null(column.combine_chunks(), ""))
+        return encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+
+    titles = pc.utf8_trim_whitespace(pc.replace_substring_regex(pc.utf8_lower(table["title"]), NON_WORD, " "))
+    days = pc.cast(table["date"], pa.int32()).to_numpy().astype(np.int64) + EPOCH_ORDINAL
+    return (table["id"].to_numpy(), table["user_id"].to_numpy(), codes(titles),
+            table["amount"].to_numpy(), codes(table["category"]), days)
+
+def find_duplicates(ids, user_ids, titles, amounts, days, window=None):
+    # Hash (user, title, cents) into one key, sort by key then day, and a
+    # duplicate is a row whose neighbour shares the key within the window.
+    # Sorting keeps this O(n log n) instead of comparing pairs.
+    window = config.DUPLICATE_WINDOW_DAYS if window is None else window
+    n = len(ids)
+    if n == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    keys = _mix(user_ids, titles, np.rint(amounts * 100).astype(np.int64))
+    order = np.lexsort((ids, days, keys))
+    keys, days = keys[order], days[order]
+    joined = np.zeros(n, dtype=bool)
+    joined[1:] = (keys[1:] == keys[:-1]) & (days[1:] - days[:-1] <= window)
+    cluster = np.cumsum(~joined) - 1
+    # The oldest row (lowest id) of each cluster is the original.
+    original = np.full(cluster[-1] + 1, np.iinfo(np.int64).max)
+    np.minimum.at(original, cluster, ids[order])
+    related = original[cluster]
+    hit = related != ids[order]
+    return order[hit], related[hit]
+
+def find_outliers(ids, user_ids, categories, amounts, days, window=None, min_history=None, threshold=None):
+    # z-score of log(amount) against the same user and category over the
+    # trailing window of days. Window sums come from prefix sums, with
+    # searchsorted finding each window's start.
+    window = config.OUTLIER_WINDOW_DAYS if window is None else window
+    min_history = config.OUTLIER_MIN_HISTORY if min_history is None else min_history
+    threshold = config.OUTLIER_Z if threshold is None else threshold
+    positions = np.flatnonzero(amounts > 0)
+    if len(positions) == 0:
+        return positions, np.empty(0)
+    _, groups = np.unique(_mix(user_ids[positions], categories[positions]), return_inverse=True)
+    order = np.lexsort((ids[positions], days[positions], groups))
+    positions = positions[order]
+    keys = groups[order] * (1 << 22) + days[positions]
+    x = np.log(amounts[positions])
+    # Rows on earlier days only, so same-day rows don't vouch for each other.
+    left = np.searchsorted(keys, keys - window, "left")
+    right = np.searchsorted(keys, keys, "left")
+    sums = np.concatenate(([0.0], np.cumsum(x)))
+    squares = np.concatenate(([0.0], np.cumsum(x * x)))
+    count = right - left
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (sums[right] - sums[left]) / count
+        var = (squares[right] - squares[left]) / count - mean * mean
+        z = (x - mean) / np.maximum(np.sqrt(np.maximum(var, 0.0)), MIN_LOG_STD)
+    hit = (count >= min_history) & (np.abs(z) >= threshold)
+    return positions[hit], z[hit]
+
+def _duplicate_flags(frame, now):
+    ids, user_ids, titles, amounts, categories, days = frame
+    duplicates, originals = find_duplicates(ids, user_ids, titles, amounts, days)
+    return [
+        {"user_id": u, "expense_id": i, "kind": DUPLICATE, "score": None, "related_id": r, "created_at": now}
+        for u, i, r in zip(user_ids[duplicates].tolist(), ids[duplicates].tolist(), originals.tolist())
+    ]
+
+def _outlier_flags(frame, now):
+    ids, user_ids, titles, amounts, categories, days = frame
+    outliers, scores = find_outliers(ids, user_ids, categories, amounts, days)
+    return [
+        {"user_id": u, "expense_id": i, "kind": OUTLIER, "score": round(z, 2), "related_id": None, "created_at": now}
+        for u, i, z in zip(user_ids[outliers].tolist(), ids[outliers].tolist(), scores.tolist())
+    ]
+
+def detect(frame):
+    now = datetime.utcnow()
+    return _duplicate_flags(frame, now) + _outlier_flags(frame, now)
+
+COLUMNS = (models.Expense.id, models.Expense.user_id, models.Expense.title, models.Expense.amount,
+           models.Expense.category, models.Expense.date)
+
+def _frame_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("title", pa.string()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+        ("date", pa.date32()),
+    ])
+
+def _duplicate_key(row):
+    return normalise(row.title), round(row.amount * 100)
+
+def _candidates(user_id, columns=COLUMNS):
+    return select(*columns).where(models.Expense.user_id == user_id, models.Expense.amount.is_not(None),
+                                  models.Expense.date.is_not(None))
+
+async def _same_amount(db: AsyncSession, user_id, seeds):
+    # Every row that could share a duplicate cluster with the seeds. A cluster
+    # can chain across any span of dates (a daily charge), so there's no date
+    # bound; ix_expenses_user_amount keeps it to the matching amounts.
+    return (await db.execute(
+        _candidates(user_id).where(models.Expense.amount.in_({r.amount for r in seeds}))
+    )).all()
+
+async def _history(db: AsyncSession, user_id, rows):
+    # The new rows' categories over the trailing outlier window. Titles aren't
+    # needed for outlier stats, so they aren't fetched.
+    columns = tuple(null().label("title") if c is models.Expense.title else c for c in COLUMNS)
+    return (await db.execute(_candidates(user_id, columns).where(
+        models.Expense.category.in_({r.category for r in rows}),
+        models.Expense.date.between(min(r.date for r in rows) - timedelta(days=config.OUTLIER_WINDOW_DAYS),
+                                    max(r.date for r in rows)),
+    ))).all()
+
+def _flags(same_amount, clustered, history, added_ids):
+    now = datetime.utcnow()
+    flags = []
+    if same_amount:
+        flags += [f for f in _duplicate_flags(frame_from_rows(same_amount), now) if f["expense_id"] in clustered]
+    if history:
+        flags += [f for f in _outlier_flags(frame_from_rows(history), now) if f["expense_id"] in added_ids]
+    return flags
+
+async def _insert(db: AsyncSession, flags):
+    for start in range(0, len(flags), FLAG_CHUNK):
+        await db.execute(insert(models.ExpenseFlag), flags[start:start + FLAG_CHUNK])
+
+async def _clear(db: AsyncSession, user_id, kind, ids, related_ids=()):
+    ids, related_ids = sorted(ids), sorted(related_ids)
+    for start in range(0, max(len(ids), len(related_ids)), DELETE_CHUNK):
+        await db.execute(delete(models.ExpenseFlag).where(
+            models.ExpenseFlag.user_id == user_id, models.ExpenseFlag.kind == kind,
+            or_(models.ExpenseFlag.expense_id.in_(ids[start:start + DELETE_CHUNK]),
+                models.ExpenseFlag.related_id.in_(related_ids[start:start + DELETE_CHUNK])),
+        ))
+
+async def record(db: AsyncSession, user_id, added=(), removed=()):
+    # Runs inside the write's transaction. The flush makes new and edited
+    # rows visible to the queries below. Every duplicate cluster a row left
+    # (its old values in removed) or joined is recomputed, since editing or
+    # deleting a cluster's original changes every other member's flag.
+    if not config.ANOMALY_DETECTION:
+        return
+    if added:
+        await db.flush()
+    added_ids = {e.id for e in added}
+    removed_ids = {e.id for e in removed}
+    rows = [e for e in added if e.date is not None and e.amount is not None]
+    seeds = rows + [e for e in removed if e.date is not None and e.amount is not None]
+    same_amount = await _same_amount(db, user_id, seeds) if seeds else []
+    keys = {_duplicate_key(r) for r in seeds}
+    clustered = {r.id for r in same_amount if _duplicate_key(r) in keys}
+    await _clear(db, user_id, DUPLICATE, clustered | added_ids | removed_ids, removed_ids)
+    await _clear(db, user_id, OUTLIER, added_ids | removed_ids)
+    history = await _history(db, user_id, rows) if rows else []
+    flags = await run_in_threadpool(_flags, same_amount, clustered, history, added_ids)
+    if flags:
+        await _insert(db, flags)
+
+async def backfill(db: AsyncSession, user_id=None):
+    from app import analytics
+    # Arrow end to end (COPY on Postgres), so a million rows never become Python objects.
+    stmt = select(*COLUMNS).where(models.Expense.date.is_not(None), models.Expense.amount.is_not(None))
+    clear = delete(models.ExpenseFlag)
+    if user_id is not None:
+        stmt = stmt.where(models.Expense.user_id == user_id)
+        clear = clear.where(models.ExpenseFlag.user_id == user_id)
+    table = await analytics.query_table(db, stmt, _frame_schema())
+    flags = await run_in_threadpool(lambda: detect(frame_from_table(table))) if table.num_rows else []
+    await db.execute(clear)
+    await _insert(db, flags)
+    await db.commit()
+    return {
+        "rows": table.num_rows,
+        "duplicates": sum(f["kind"] == DUPLICATE for f in flags),
+        "outliers": sum(f["kind"] == OUTLIER for f in flags),
+    }
+
+async def flagged(db: AsyncSession, user_id, kind=None, start=None, end=None, limit=100):
+    stmt = (
+        select(models.ExpenseFlag.expense_id, models.ExpenseFlag.kind, models.ExpenseFlag.score,
+               models.ExpenseFlag.related_id, models.Expense.title, models.Expense.amount,
+               models.Expense.category, models.Expense.date)
+        .join(models.Expense, and_(models.Expense.user_id == models.ExpenseFlag.user_id,
+                                   models.Expense.id == models.ExpenseFlag.expense_id))
+        .where(models.ExpenseFlag.user_id == user_id)
+    )
+    if kind is not None:
+        stmt = stmt.where(models.ExpenseFlag.kind == kind)
+    if start is not None:
+        stmt = stmt.where(models.Expense.date >= start)
+    if end is not None:
+        stmt = stmt.where(models.Expense.date <= end)
+    rows = await db.execute(stmt.order_by(models.Expense.date.desc(), models.Expense.id.desc()).limit(limit))
+    return [
+        {"id": r.expense_id, "kind": r.kind, "score": r.score, "related_id": r.related_id,
+         "title": r.title, "amount": r.amount, "category": r.category, "date": r.date}
+        for r in rows
+    ]
+
+async def _backfill(user_id):
+    try:
+        async with database.AsyncSessionLocal() as db:
+            return await backfill(db, user_id)
+    finally:
+        await database.async_engine.dispose()
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.anomalies", description="Duplicate and outlier detection")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_cmd = commands.add_parser("backfill", help="recompute every flag from the expenses table")
+    backfill_cmd.add_argument("--user", type=int, help="only this user id")
+    args = parser.parse_args(argv)
+    started = datetime.now()
+    result = asyncio.run(_backfill(args.user))
+    print(f"Scanned {result['rows']} rows in {(datetime.now() - started).total_seconds():.1f}s: "
+          f"{result['duplicates']} duplicates, {result['outliers']} outliers")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import base64
+import getpass
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import time
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app import config, database, models
+
+HASH_SCHEME = "pbkdf2_sha256"
+MIN_PASSWORD_LENGTH = 8
+
+class UsernameTaken(Exception):
+    pass
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def hash_password(password, iterations=None):
+    iterations = iterations or config.PASSWORD_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{HASH_SCHEME}${iterations}${_b64(salt)}${_b64(digest)}"
+
+def verify_password(password, encoded):
+    try:
+        scheme, iterations, salt, expected = encoded.split("$")
+    except ValueError:
+        return False
+    if scheme != HASH_SCHEME:
+        return False
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), _unb64(salt), int(iterations))
+    return hmac.compare_digest(digest, _unb64(expected))
+
+def check_secret():
+    if not config.SECRET_KEY:
+        raise RuntimeError("SECRET_KEY is not set; set it to a long random value, "
+                           "or ALLOW_INSECURE_SECRET=1 to use the built-in development key")
+
+def _sign(payload):
+    return _b64(hmac.new(config.SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest())
+
+def _payload(user_id, expires, scope):
+    # A scoped token is signed over its scope too, so it is only good for that path.
+    return f"{user_id}.{expires}" if scope is None else f"{user_id}.{expires}.{scope}"
+
+def issue_token(user_id, ttl=None, scope=None):
+    expires = int(time.time()) + (ttl or config.TOKEN_TTL_SECONDS)
+    return f"{user_id}.{expires}.{_sign(_payload(user_id, expires, scope))}", expires
+
+def verify_token(token, scope=None):
+    try:
+        user_id, expires, signature = token.split(".")
+        user_id, expires = int(user_id), int(expires)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _sign(_payload(user_id, expires, scope))) or expires < time.time():
+        return None
+    return user_id
+
+def _bearer(authorization):
+    scheme, _, token = (authorization or "").partition(" ")
+    return verify_token(token) if scheme.lower() == "bearer" else None
+
+async def _exists(db, user_id):
+    # The signature only proves the token was issued; the account may have been deleted since.
+    return await db.scalar(select(models.User.id).where(models.User.id == user_id)) is not None
+
+def _unauthorized():
+    return HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+async def current_user(authorization: str = Header(None), db: AsyncSession = Depends(database.get_db)):
+    user_id = _bearer(authorization)
+    if user_id is None or not await _exists(db, user_id):
+        raise _unauthorized()
+    return user_id
+
+async def streaming_user(request: Request, token: Optional[str] = None, authorization: str = Header(None)):
+    # For streamed responses: accepts a link token scoped to this path, so a
+    # browser can download without an Authorization header, and checks the
+    # user in a session of its own that is closed before the stream starts.
+    user_id = verify_token(token, scope=request.url.path) if token else _bearer(authorization)
+    if user_id is not None:
+        async with database.AsyncSessionLocal() as db:
+            if not await _exists(db, user_id):
+                user_id = None
+    if user_id is None:
+        raise _unauthorized()
+    return user_id
+
+async def create_user(db: AsyncSession, username, password):
+    password_hash = await run_in_threadpool(hash_password, password)
+    user = models.User(username=username, password_hash=password_hash)
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise UsernameTaken(username) from e
+    return user
+
+async def authenticate(db: AsyncSession, username, password):
+    user = (await db.scalars(select(models.User).where(models.User.username == username))).first()
+    if user is None:
+        # Spend the same hashing time so response time doesn't reveal which names exist.
+        await run_in_threadpool(hash_password, password)
+        return None
+    if not await run_in_threadpool(verify_password, password, user.password_hash):
+        return None
+    return user
+
+async def set_password(db: AsyncSession, username, password):
+    user = (await db.scalars(select(models.User).where(models.User.username == username))).first()
+    if user is None:
+        return False
+    user.password_hash = await run_in_threadpool(hash_password, password)
+    await db.commit()
+    return True
+
+async def _run(command, username, password):
+    try:
+        async with database.AsyncSessionLocal() as db:
+            if command == "create-user":
+                try:
+                    user = await create_user(db, username, password)
+                except UsernameTaken:
+                    print(f"User {username} already exists")
+                    return 1
+                print(f"Created user {username} (id {user.id})")
+                return 0
+            if not await set_password(db, username, password):
+                print(f"No user named {username}")
+                return 1
+            print(f"Password updated for {username}")
+            return 0
+    finally:
+        await database.async_engine.dispose()
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.auth", description="Manage API users")
+    parser.add_argument("command", choices=("create-user", "set-password"))
+    parser.add_argument("username")
+    args = parser.parse_args(argv)
+    password = os.getenv("EXPENSE_PASSWORD") or getpass.getpass("Password: ")
+    if len(password) < MIN_PASSWORD_LENGTH:
+        print(f"Password must be at least {MIN_PASSWORD_LENGTH} characters")
+        return 2
+    return asyncio.run(_run(args.command, args.username, password))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,74 @@
+import re
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, database
+
+MONTH_PATTERN = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+def valid_month(month):
+    return bool(MONTH_PATTERN.match(month))
+
+async def effective(db: AsyncSession, user_id, month, category=""):
+    result = await db.execute(
+        select(models.Budget)
+        .where(models.Budget.user_id == user_id, models.Budget.category == category, models.Budget.month <= month)
+        .order_by(models.Budget.month.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+async def for_month(db: AsyncSession, user_id, month):
+    latest = (
+        select(models.Budget.category, func.max(models.Budget.month).label("month"))
+        .where(models.Budget.user_id == user_id, models.Budget.month <= month)
+        .group_by(models.Budget.category)
+        .subquery()
+    )
+    result = await db.execute(
+        select(models.Budget)
+        .join(latest, (models.Budget.category == latest.c.category) & (models.Budget.month == latest.c.month))
+        .where(models.Budget.user_id == user_id)
+        .order_by(models.Budget.category)
+    )
+    return result.scalars().all()
+
+async def set_budget(db: AsyncSession, user_id, month, amount, category=""):
+    stmt = database.upsert_insert(db, models.Budget).values(user_id=user_id, month=month, category=category, amount=amount)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.Budget.user_id, models.Budget.month, models.Budget.category],
+        set_={"amount": stmt.excluded.amount},
+    ))
+    await db.commit()
+    return {"month": month, "category": category, "amount": amount}
+
+async def delete_budget(db: AsyncSession, user_id, month, category=""):
+    result = await db.execute(delete(models.Budget).where(
+        models.Budget.user_id == user_id, models.Budget.month == month, models.Budget.category == category,
+    ))
+    await db.commit()
+    return result.rowcount
+
+async def month_total(db: AsyncSession, user_id, month, category=None):
+    stmt = select(func.coalesce(func.sum(models.MonthlyTotal.total), 0.0)).where(
+        models.MonthlyTotal.user_id == user_id, models.MonthlyTotal.month == month,
+    )
+    if category:
+        stmt = stmt.where(models.MonthlyTotal.category == category)
+    return float((await db.execute(stmt)).scalar_one())
+
+async def status(db: AsyncSession, user_id, month, amount=0.0, category=""):
+    budget = await effective(db, user_id, month, category)
+    current_total = await month_total(db, user_id, month, category)
+    projected_total = current_total + amount
+    limit = budget.amount if budget else None
+    return {
+        "month": month,
+        "category": category,
+        "budget": limit,
+        "budget_month": budget.month if budget else None,
+        "current_total": round(current_total, 2),
+        "amount": round(amount, 2),
+        "projected_total": round(projected_total, 2),
+        "remaining": round(limit - projected_total, 2) if limit is not None else None,
+        "exceeded": limit is not None and projected_total > limit,
+    }
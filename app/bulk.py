@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import config, database, ledger, models, pagination, versioning
+
+COLUMNS = ledger.COLUMNS
+MAX_IDS = 1000
+
+class TooManyRows(Exception):
+    pass
+
+def _conditions(table, user_id, ids=None, start=None, end=None, category=None):
+    conditions = [table.c.user_id == user_id]
+    if ids is not None:
+        conditions.append(table.c.id.in_(ids))
+    if start is not None:
+        conditions.append(table.c.date >= start)
+    if end is not None:
+        conditions.append(table.c.date <= end)
+    if category is not None:
+        conditions.append(table.c.category == category)
+    return conditions
+
+def _snapshots(rows, offset=0):
+    return [SimpleNamespace(**dict(zip(COLUMNS, row[offset:offset + len(COLUMNS)]))) for row in rows]
+
+async def _check_size(db: AsyncSession, conditions):
+    # Counted before the statement runs, so an oversized selector changes nothing.
+    matched = await db.scalar(select(func.count()).select_from(models.Expense.__table__).where(*conditions))
+    if matched > config.BULK_MAX_ROWS:
+        raise TooManyRows(matched)
+
+async def update_expenses(db: AsyncSession, user_id, values, **selector):
+    # Takes the user's data_version lock first, so no other write to this
+    # user can land between reading the old values and the update.
+    await versioning.bump(db, user_id)
+    table = models.Expense.__table__
+    new = [table.c[c] for c in COLUMNS]
+    conditions = _conditions(table, user_id, **selector)
+    await _check_size(db, conditions)
+    if database.dialect_name(db) == "postgresql":
+        # One statement: the self-join reads each row as it was before the update.
+        old = table.alias("old")
+        rows = (await db.execute(
+            update(table).values(**values)
+            .where(table.c.user_id == old.c.user_id, table.c.id == old.c.id, *conditions, old.c.user_id == user_id)
+            .returning(*(old.c[c] for c in COLUMNS), *new)
+        )).all()
+        removed, added = _snapshots(rows), _snapshots(rows, len(COLUMNS))
+    else:
+        # SQLite's RETURNING can't see a joined table. The bump above already
+        # holds the write lock, so the old values can't change in between.
+        removed = _snapshots((await db.execute(select(*new).where(*conditions))).all())
+        rows = (await db.execute(update(table).values(**values).where(*conditions).returning(*new))).all()
+        added = _snapshots(rows)
+    await ledger.record(db, user_id, added=added, removed=removed, bump=False)
+    return [{c: getattr(e, c) for c in pagination.EXPORT_COLUMNS} for e in added]
+
+async def delete_expenses(db: AsyncSession, user_id, **selector):
+    await versioning.bump(db, user_id)
+    table = models.Expense.__table__
+    conditions = _conditions(table, user_id, **selector)
+    await _check_size(db, conditions)
+    rows = (await db.execute(delete(table).where(*conditions).returning(*(table.c[c] for c in COLUMNS)))).all()
+    await ledger.record(db, user_id, removed=_snapshots(rows), bump=False)
+    return [row.id for row in rows]
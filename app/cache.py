@@ -0,0 +1,253 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import format_datetime
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+import orjson
+from app import config, metrics, versioning
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSORS = {"gzip": lambda body: gzip.compress(body, compresslevel=5)}
+if brotli is not None:
+    # Quality 11 (the default) is far too slow for responses; 4 still beats gzip on size.
+    COMPRESSORS["br"] = lambda body: brotli.compress(bytes(body), quality=4)
+PREFERENCE = ("br", "gzip")
+
+class CacheBackend:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set_many(self, items):
+        for key, value in items:
+            self.set(key, value)
+
+class LRUBackend(CacheBackend):
+    def __init__(self, maxsize=config.RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SharedBackend(CacheBackend):
+    # A SQLite file on tmpfs (/dev/shm by default) that every worker on the
+    # host reads and writes, so a body is computed once per host rather than
+    # once per process. Keys carry the data version, so entries never change
+    # and each process can keep a small LRU in front without invalidating it.
+    TRIM_EVERY = 256
+
+    def __init__(self, path=None, maxsize=config.SHARED_CACHE_SIZE, local_size=config.RESPONSE_CACHE_SIZE):
+        self.path = str(path or config.SHARED_CACHE_PATH)
+        self.maxsize = maxsize
+        self.local = LRUBackend(local_size)
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._connections = threading.local()
+        self._inherited = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, stored INTEGER NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_stored ON entries (stored)")
+        return conn
+
+    def _connection(self):
+        # One connection per thread. A connection inherited across a fork is
+        # left open: closing it in the child could checkpoint and remove the
+        # WAL file the other workers are still using.
+        conn = getattr(self._connections, "conn", None)
+        if conn is None or self._connections.pid != os.getpid():
+            if conn is not None:
+                self._inherited.append(conn)
+            conn = self._connect()
+            self._connections.conn, self._connections.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def get_many(self, keys):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            try:
+                rows = self._connection().execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({','.join('?' * len(missing))})", missing
+                ).fetchall()
+            except sqlite3.Error:
+                # A busy or missing file is a miss; the cache is never required.
+                rows = []
+            for key, value in rows:
+                self.local.set(key, value)
+                found[key] = value
+        values = [found.get(key) for key in keys]
+        hits = sum(v is not None for v in values)
+        self.hits += hits
+        self.misses += len(values) - hits
+        return values
+
+    def set_many(self, items):
+        items = [(key, bytes(value)) for key, value in items]
+        for key, value in items:
+            self.local.set(key, value)
+        stored = time.time_ns()
+        try:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO entries (key, value, stored) VALUES (?, ?, ?)",
+                             [(key, value, stored) for key, value in items])
+            self._writes += len(items)
+            if self._writes >= self.TRIM_EVERY:
+                self._writes = 0
+                conn.execute("DELETE FROM entries WHERE stored <= (SELECT stored FROM entries "
+                             "ORDER BY stored DESC LIMIT 1 OFFSET ?)", (self.maxsize,))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        # On a connection of its own, so a server can clear the cache in its
+        # parent process without holding the file open into its workers.
+        self.local.clear()
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM entries")
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            pass
+
+_backend = LRUBackend()
+
+def configure(backend: CacheBackend):
+    global _backend
+    _backend = backend
+
+def get_backend():
+    return _backend
+
+def shared_backend():
+    return _backend if isinstance(_backend, SharedBackend) else None
+
+def configure_from_env():
+    if config.CACHE_BACKEND == "shared":
+        configure(SharedBackend())
+    elif config.CACHE_BACKEND != "memory":
+        raise ValueError(f"CACHE_BACKEND must be memory or shared, not {config.CACHE_BACKEND!r}")
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in header.split(","))
+
+def request_key(request: Request, user_id, version):
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{user_id}:{request.url.path}?{params}#{version}"
+
+def dumps(value):
+    # orjson handles dicts, lists, dates and floats natively; anything else
+    # (pydantic models, numpy scalars) goes through jsonable_encoder.
+    return orjson.dumps(value, default=jsonable_encoder, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def choose_encoding(accept_encoding, size):
+    if not config.RESPONSE_COMPRESSION or size < config.COMPRESSION_MIN_BYTES or not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for name in PREFERENCE:
+        if name in COMPRESSORS and accepted.get(name, accepted.get("*", 0.0)) > 0:
+            return name
+    return None
+
+async def respond(request: Request, db: AsyncSession, user_id, compute, encode=dumps, media_type="application/json"):
+    version, updated_at = await versioning.current(db, user_id)
+    key = request_key(request, user_id, version) + "|" + media_type
+    etag = 'W/"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+
+    # Only the ETag is checked: it carries the data version, while
+    # If-Modified-Since has one-second resolution and would hide a write made
+    # in the same second as the last one.
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    body = _backend.get(key)
+    metrics.RESPONSE_CACHE.labels("miss" if body is None else "hit").inc()
+    if body is None:
+        body = encode(await compute())
+        _backend.set(key, body)
+    encoding = choose_encoding(request.headers.get("accept-encoding"), len(body))
+    if encoding is not None:
+        # Each encoding is cached beside the plain body, so it's compressed once per data version.
+        packed = _backend.get(key + "|" + encoding)
+        if packed is None:
+            packed = await run_in_threadpool(COMPRESSORS[encoding], body)
+            _backend.set(key + "|" + encoding, packed)
+        body = packed
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, event, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app import cache, config, database, models
+
+CHANNEL = "expense_changes"
+FIELDS = ("title", "amount", "category", "date")
+
+class Expired(Exception):
+    pass
+
+def _state(expense):
+    state = {c: getattr(expense, c) for c in FIELDS}
+    if isinstance(state["date"], date):
+        state["date"] = state["date"].isoformat()
+    return state
+
+async def record(db: AsyncSession, user_id, added=(), removed=()):
+    # Called after versioning.bump, which locks the user's data_version row
+    # until commit. Seqs are therefore handed out in commit order per user, so
+    # a reader at seq N can't later see a smaller seq appear.
+    if any(e.id is None for e in added):
+        await db.flush()
+    before = {e.id: _state(e) for e in removed}
+    rows = [
+        {"user_id": user_id, "expense_id": e.id, "op": "update" if e.id in before else "insert",
+         "before": before.pop(e.id, None), "after": _state(e)}
+        for e in added
+    ]
+    rows += [{"user_id": user_id, "expense_id": i, "op": "delete", "before": b, "after": None}
+             for i, b in before.items()]
+    if not rows:
+        return
+    now = datetime.utcnow()
+    await db.execute(insert(models.ExpenseChange), [{**r, "changed_at": now} for r in rows])
+    if config.CHANGE_NOTIFY and database.dialect_name(db) == "postgresql":
+        # Delivered on commit, to every API process listening.
+        await db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": str(user_id)})
+    db.sync_session.info.setdefault("changed_users", set()).add(user_id)
+
+async def latest(db: AsyncSession, user_id):
+    return await db.scalar(
+        select(func.max(models.ExpenseChange.seq)).where(models.ExpenseChange.user_id == user_id)
+    ) or 0
+
+async def since(db: AsyncSession, user_id, seq, limit):
+    # Anything at or below the oldest pruned seq may be gone; the client has to reload.
+    oldest = await db.scalar(select(func.min(models.ExpenseChange.seq)))
+    if oldest is not None and seq < oldest - 1:
+        raise Expired(oldest)
+    rows = (await db.execute(
+        select(models.ExpenseChange.seq, models.ExpenseChange.expense_id, models.ExpenseChange.op,
+               models.ExpenseChange.before, models.ExpenseChange.after)
+        .where(models.ExpenseChange.user_id == user_id, models.ExpenseChange.seq > seq)
+        .order_by(models.ExpenseChange.seq).limit(limit)
+    )).all()
+    return [{"seq": r.seq, "op": r.op, "id": r.expense_id, "before": r.before, "after": r.after} for r in rows]
+
+async def prune(db: AsyncSession, older_than):
+    newest = await db.scalar(select(func.max(models.ExpenseChange.seq)))
+    # The newest row is kept so the oldest-seq check above still has a floor.
+    result = await db.execute(
+        delete(models.ExpenseChange)
+        .where(models.ExpenseChange.changed_at < older_than, models.ExpenseChange.seq < (newest or 0))
+    )
+    await db.commit()
+    return result.rowcount
+
+_waiters = {}
+
+def wake(user_id):
+    for waiter in _waiters.get(user_id, ()):
+        waiter.set()
+
+@contextmanager
+def subscribe(user_id):
+    waiter = asyncio.Event()
+    _waiters.setdefault(user_id, set()).add(waiter)
+    try:
+        yield waiter
+    finally:
+        _waiters[user_id].discard(waiter)
+        if not _waiters[user_id]:
+            del _waiters[user_id]
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    for user_id in session.info.pop("changed_users", ()):
+        wake(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("changed_users", None)
+
+async def listen():
+    # Wakes this process's streams when another process (an API worker or a
+    # job) commits a change. Without it streams still catch up by polling.
+    def on_notify(connection, pid, channel, payload):
+        wake(int(payload))
+
+    while True:
+        try:
+            async with database.async_engine.connect() as conn:
+                raw = (await conn.get_raw_connection()).driver_connection
+                await raw.add_listener(CHANNEL, on_notify)
+                while True:
+                    await asyncio.sleep(config.CHANGE_KEEPALIVE_SECONDS)
+                    await conn.exec_driver_sql("SELECT 1")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await asyncio.sleep(config.CHANGE_POLL_SECONDS)
+
+def _event(change):
+    return b"id: %d\nevent: change\ndata: %s\n\n" % (change["seq"], cache.dumps(change))
+
+async def stream(user_id, seq, is_disconnected, batch=1000):
+    with subscribe(user_id) as waiter:
+        idle_since = time.monotonic()
+        while not await is_disconnected():
+            waiter.clear()
+            try:
+                async with database.AsyncSessionLocal() as db:
+                    batch_changes = await since(db, user_id, seq, batch)
+            except Expired:
+                yield b"event: expired\ndata: {}\n\n"
+                return
+            for change in batch_changes:
+                yield _event(change)
+                seq = change["seq"]
+            if batch_changes:
+                idle_since = time.monotonic()
+                if len(batch_changes) == batch:
+                    continue
+            elif time.monotonic() - idle_since >= config.CHANGE_KEEPALIVE_SECONDS:
+                # A comment line keeps proxies from closing an idle connection.
+                yield b": keepalive\n\n"
+                idle_since = time.monotonic()
+            try:
+                await asyncio.wait_for(waiter.wait(), config.CHANGE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+async def _prune(days):
+    try:
+        async with database.AsyncSessionLocal() as db:
+            return await prune(db, datetime.utcnow() - timedelta(days=days))
+    finally:
+        await database.async_engine.dispose()
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.changes", description="Maintain the expense change feed")
+    commands = parser.add_subparsers(dest="command", required=True)
+    prune_cmd = commands.add_parser("prune", help="delete changes older than --days")
+    prune_cmd.add_argument("--days", type=float, default=config.CHANGE_RETENTION_DAYS)
+    args = parser.parse_args(argv)
+    print(f"Deleted {asyncio.run(_prune(args.days))} changes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,217 @@
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import joblib
+import orjson
+from starlette.concurrency import run_in_threadpool
+from app import cache, config, metrics, model_store, compact_model
+
+MODEL_PATH = Path(__file__).resolve().parent.parent / "category_classifier.pkl"
+CACHE_SIZE = 4096
+BATCH_WAIT_SECONDS = 0.002
+MAX_BATCH_SIZE = 256
+
+_whitespace = re.compile(r"\s+")
+
+def normalize(title):
+    return _whitespace.sub(" ", title.strip().lower())
+
+class CategoryClassifier:
+    def __init__(self, model, cache_size=CACHE_SIZE, shared=None, namespace=""):
+        self.model = model
+        self.classes = [str(c) for c in model.classes_]
+        self.cache_size = cache_size
+        # A cache shared with the other workers on this host, consulted on a
+        # local miss. The namespace keeps one model's scores from another's.
+        self.shared = shared
+        self.namespace = namespace
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.model_calls = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, cache_size=CACHE_SIZE, shared=None, namespace=""):
+        if compact_model.is_compact(path):
+            return cls(compact_model.CompactModel.load(path), cache_size, shared, namespace)
+        return cls(joblib.load(path), cache_size, shared, namespace)
+
+    def _remember(self, key, ordered):
+        self._cache[key] = ordered
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def rank(self, titles):
+        keys = [normalize(t) for t in titles]
+        ranked = {}
+        with self._lock:
+            for key in keys:
+                if key in ranked:
+                    continue
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    ranked[key] = self._cache[key]
+                    self.hits += 1
+            misses = [k for k in dict.fromkeys(keys) if k not in ranked]
+        if misses and self.shared is not None:
+            found = self.shared.get_many([f"classifier:{self.namespace}:{k}" for k in misses])
+            with self._lock:
+                for key, body in zip(misses, found):
+                    if body is not None:
+                        ranked[key] = [tuple(pair) for pair in orjson.loads(body)]
+                        self._remember(key, ranked[key])
+                        self.shared_hits += 1
+            misses = [k for k in misses if k not in ranked]
+        with self._lock:
+            self.misses += len(misses)
+        if misses:
+            with metrics.CLASSIFIER_INFERENCE.time():
+                probabilities = self.model.predict_proba(misses)
+            metrics.CLASSIFIER_BATCH_SIZE.observe(len(misses))
+            with self._lock:
+                self.model_calls += 1
+                for key, row in zip(misses, probabilities):
+                    ranked[key] = sorted(zip(self.classes, row.tolist()), key=lambda p: p[1], reverse=True)
+                    self._remember(key, ranked[key])
+            if self.shared is not None:
+                self.shared.set_many([(f"classifier:{self.namespace}:{k}", orjson.dumps(ranked[k])) for k in misses])
+        return [ranked[k] for k in keys]
+
+    def predict(self, titles):
+        return [r[0][0] for r in self.rank(titles)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "model_calls": self.model_calls,
+                "cache_size": len(self._cache),
+                "cache_capacity": self.cache_size,
+            }
+
+class MicroBatcher:
+    def __init__(self, classifier, wait=BATCH_WAIT_SECONDS, max_batch=MAX_BATCH_SIZE):
+        self.classifier = classifier
+        self.wait = wait
+        self.max_batch = max_batch
+        self._pending = []
+        self._pending_titles = 0
+        self._timer = None
+
+    async def rank(self, titles):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((titles, future))
+        self._pending_titles += len(titles)
+        if self._pending_titles >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.wait, self._flush_now)
+        return await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._pending_titles = self._pending, [], 0
+        if pending:
+            asyncio.ensure_future(self._run(pending))
+
+    async def _run(self, pending):
+        titles = [t for batch, _ in pending for t in batch]
+        try:
+            ranked = await run_in_threadpool(self.classifier.rank, titles)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for batch, future in pending:
+            if not future.done():
+                future.set_result(ranked[offset:offset + len(batch)])
+            offset += len(batch)
+
+_classifier = None
+_batcher = None
+_version = None
+_load_lock = threading.Lock()
+
+def _install(classifier, version=None):
+    global _classifier, _batcher, _version
+    _classifier = classifier
+    _batcher = MicroBatcher(classifier)
+    _version = version
+    return classifier
+
+def _resolve():
+    manifest = model_store.read_manifest()
+    if manifest is None:
+        return MODEL_PATH, None
+    return model_store.artifact_path(manifest), manifest["version"]
+
+def _load(path, version=None):
+    return CategoryClassifier.load(path, shared=cache.shared_backend(), namespace=version or Path(path).name)
+
+def load(path=None):
+    with _load_lock:
+        if path is not None:
+            return _install(_load(path))
+        path, version = _resolve()
+        return _install(_load(path, version), version)
+
+def loaded():
+    return _classifier is not None
+
+def reload_if_changed():
+    # The new model is built before the swap; requests already holding the old
+    # classifier or batcher finish against it.
+    if model_store.current_version() == _version:
+        return False
+    load()
+    return True
+
+async def watch(interval=None):
+    interval = interval or config.MODEL_POLL_SECONDS
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, reload_if_changed)
+        except Exception:
+            # A half-written or broken artifact keeps the current model serving.
+            continue
+
+def _ensure_loaded():
+    if _classifier is None:
+        with _load_lock:
+            if _classifier is None:
+                path, version = _resolve()
+                _install(_load(path, version), version)
+
+async def wait_loaded():
+    # For request handlers: a model still loading (or not yet started) is
+    # waited for on a worker thread, so the event loop keeps serving.
+    if _classifier is None:
+        await run_in_threadpool(_ensure_loaded)
+
+def get_classifier():
+    _ensure_loaded()
+    return _classifier
+
+def get_batcher():
+    _ensure_loaded()
+    return _batcher
+
+def version():
+    return _version
+
+def predict(titles):
+    if not titles:
+        return []
+    return get_classifier().predict(list(titles))
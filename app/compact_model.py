@@ -0,0 +1,209 @@
+import argparse
+import json
+import math
+import re
+from pathlib import Path
+import numpy as np
+
+FORMAT = "npy"
+META_NAME = "meta.json"
+
+def _murmurhash3_32(data: bytes, seed=0):
+    # Same hash as sklearn.utils.murmurhash3_32(positive=False), so hashed
+    # models can be scored without importing sklearn.
+    c1, c2 = 0xCC9E2D51, 0x1B873593
+    h = seed & 0xFFFFFFFF
+    length = len(data)
+    tail = length & ~3
+    for i in range(0, tail, 4):
+        k = int.from_bytes(data[i:i + 4], "little")
+        k = (k * c1) & 0xFFFFFFFF
+        k = ((k << 15) | (k >> 17)) & 0xFFFFFFFF
+        k = (k * c2) & 0xFFFFFFFF
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & 0xFFFFFFFF
+        h = (h * 5 + 0xE6546B64) & 0xFFFFFFFF
+    k = 0
+    rest = length & 3
+    if rest == 3:
+        k ^= data[tail + 2] << 16
+    if rest >= 2:
+        k ^= data[tail + 1] << 8
+    if rest >= 1:
+        k ^= data[tail]
+        k = (k * c1) & 0xFFFFFFFF
+        k = ((k << 15) | (k >> 17)) & 0xFFFFFFFF
+        k = (k * c2) & 0xFFFFFFFF
+        h ^= k
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+    h ^= h >> 16
+    return h - (1 << 32) if h & 0x80000000 else h
+
+def _vectorizer_meta(vectorizer):
+    params = vectorizer.get_params()
+    if params["analyzer"] != "word" or params["tokenizer"] or params["preprocessor"] \
+            or params["strip_accents"] or params["stop_words"] is not None:
+        raise ValueError("Only word analyzers with the default tokenizer can be exported")
+    meta = {
+        "lowercase": params["lowercase"],
+        "token_pattern": params["token_pattern"],
+        "ngram_range": list(params["ngram_range"]),
+        "binary": params["binary"],
+        "norm": params["norm"],
+    }
+    if hasattr(vectorizer, "vocabulary_"):
+        meta.update(kind="tfidf", use_idf=params["use_idf"], sublinear_tf=params["sublinear_tf"])
+    else:
+        meta.update(kind="hashing", n_features=params["n_features"], alternate_sign=params["alternate_sign"])
+    return meta
+
+def _link(clf):
+    if clf.__class__.__name__ == "LogisticRegression":
+        if getattr(clf, "multi_class", "auto") == "ovr" or clf.solver == "liblinear":
+            return "ovr"
+        return "softmax"
+    if getattr(clf, "loss", None) in ("log_loss", "log"):
+        return "ovr"
+    raise ValueError(f"{clf.__class__.__name__} has no probabilistic output to export")
+
+def export(model, directory):
+    vectorizer, clf = model.steps[0][1], model.steps[-1][1]
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    meta = _vectorizer_meta(vectorizer)
+    meta.update(format=FORMAT, link=_link(clf))
+    if meta["kind"] == "tfidf":
+        terms = sorted(vectorizer.vocabulary_)
+        np.save(directory / "terms.npy", np.array(terms))
+        np.save(directory / "term_index.npy", np.array([vectorizer.vocabulary_[t] for t in terms], dtype=np.int32))
+        if meta["use_idf"]:
+            np.save(directory / "idf.npy", vectorizer.idf_)
+    # Stored feature-major so scoring a document gathers whole contiguous rows.
+    np.save(directory / "coef.npy", np.ascontiguousarray(clf.coef_.T))
+    np.save(directory / "intercept.npy", np.asarray(clf.intercept_, dtype=np.float64))
+    np.save(directory / "classes.npy", np.array([str(c) for c in clf.classes_]))
+    (directory / META_NAME).write_text(json.dumps(meta, indent=2))
+    return meta
+
+class CompactModel:
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.classes_ = arrays["classes"]
+        self.coef = arrays["coef"]
+        self.intercept = arrays["intercept"]
+        self.terms = arrays.get("terms")
+        self.term_index = arrays.get("term_index")
+        self.idf = arrays.get("idf")
+        self._token = re.compile(meta["token_pattern"])
+        self._ngrams = tuple(meta["ngram_range"])
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        directory = Path(directory)
+        meta = json.loads((directory / META_NAME).read_text())
+        arrays = {p.stem: np.load(p, mmap_mode=mmap_mode) for p in directory.glob("*.npy")}
+        return cls(meta, arrays)
+
+    def _analyze(self, title):
+        if self.meta["lowercase"]:
+            title = title.lower()
+        tokens = self._token.findall(title)
+        low, high = self._ngrams
+        if high == 1:
+            return tokens
+        grams = []
+        for n in range(low, high + 1):
+            grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def _features(self, title):
+        grams = self._analyze(title)
+        counts = {}
+        if self.meta["kind"] == "tfidf":
+            if not grams:
+                return counts
+            positions = np.searchsorted(self.terms, grams)
+            for gram, pos in zip(grams, positions):
+                if pos < len(self.terms) and self.terms[pos] == gram:
+                    index = int(self.term_index[pos])
+                    counts[index] = counts.get(index, 0.0) + 1.0
+        else:
+            n_features = self.meta["n_features"]
+            for gram in grams:
+                h = _murmurhash3_32(gram.encode("utf-8"))
+                index = abs(h) % n_features
+                sign = -1.0 if self.meta["alternate_sign"] and h < 0 else 1.0
+                counts[index] = counts.get(index, 0.0) + sign
+        return counts
+
+    def _weights(self, counts):
+        indices = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.meta["binary"]:
+            values = np.sign(values)
+        if self.meta["kind"] == "tfidf":
+            if self.meta["sublinear_tf"]:
+                values = 1.0 + np.log(values)
+            if self.idf is not None:
+                values = values * self.idf[indices]
+        norm = self.meta["norm"]
+        if norm == "l2":
+            total = math.sqrt(float(values @ values))
+        elif norm == "l1":
+            total = float(np.abs(values).sum())
+        else:
+            total = 0.0
+        if total > 0:
+            values = values / total
+        return indices, values
+
+    def decision_function(self, titles):
+        scores = np.tile(self.intercept, (len(titles), 1))
+        for row, title in enumerate(titles):
+            counts = self._features(title)
+            if counts:
+                indices, values = self._weights(counts)
+                scores[row] += values @ self.coef[indices]
+        return scores
+
+    def predict_proba(self, titles):
+        scores = self.decision_function(list(titles))
+        if scores.shape[1] == 1:
+            positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        if self.meta["link"] == "softmax":
+            scores = scores - scores.max(axis=1, keepdims=True)
+            np.exp(scores, out=scores)
+        else:
+            scores = 1.0 / (1.0 + np.exp(-scores))
+        totals = scores.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        return scores / totals
+
+    def predict(self, titles):
+        return self.classes_[self.predict_proba(titles).argmax(axis=1)]
+
+def is_compact(path):
+    return (Path(path) / META_NAME).is_file()
+
+def main():
+    import joblib
+    from app import model_store
+    parser = argparse.ArgumentParser(description="Export a pickled classifier pipeline to the memory-mappable npy format")
+    parser.add_argument("source", nargs="?", default=str(Path(__file__).resolve().parent.parent / "category_classifier.pkl"))
+    parser.add_argument("--out", help="write the arrays here instead of publishing a new model version")
+    args = parser.parse_args()
+    model = joblib.load(args.source)
+    if args.out:
+        meta = export(model, args.out)
+        print(f"Exported {meta['kind']} model to {args.out}")
+    else:
+        manifest = model_store.publish(model, format=FORMAT, kind="pickle-export", source=Path(args.source).name)
+        print(f"Published model v{manifest['version']} as {manifest['artifact']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import numpy as np
+
+def _month_index(month):
+    year, mon = map(int, month.split("-"))
+    return year * 12 + mon - 1
+
+def _month_label(index):
+    year, mon = divmod(index, 12)
+    return f"{year:04d}-{mon + 1:02d}"
+
+def build_matrix(rows):
+    if not rows:
+        return [], [], np.zeros((0, 0))
+    first = min(_month_index(m) for m, _, _ in rows)
+    last = max(_month_index(m) for m, _, _ in rows)
+    categories = sorted({c for _, c, _ in rows})
+    position = {c: i for i, c in enumerate(categories)}
+    matrix = np.zeros((len(categories), last - first + 1))
+    for month, category, total in rows:
+        matrix[position[category], _month_index(month) - first] += total
+    months = [_month_label(i) for i in range(first, last + 1)]
+    return months, categories, matrix
+
+class MovingAverage:
+    min_history = 1
+
+    def __init__(self, window=3):
+        self.window = window
+
+    def forecast(self, y, horizon):
+        window = self.window if y.shape[1] >= self.window else 1
+        level = y[:, -window:].mean(axis=1)
+        return np.repeat(level[:, None], horizon, axis=1)
+
+    def one_step(self, y):
+        t = y.shape[1]
+        csum = np.concatenate([np.zeros((y.shape[0], 1)), np.cumsum(y, axis=1)], axis=1)
+        steps = np.arange(1, t + 1)
+        window = np.where(steps >= self.window, self.window, 1)
+        return (csum[:, steps] - csum[:, steps - window]) / window
+
+class ExponentialSmoothing:
+    min_history = 1
+
+    def __init__(self, alpha=0.5):
+        self.alpha = alpha
+
+    def _levels(self, y):
+        levels = np.empty_like(y)
+        levels[:, 0] = y[:, 0]
+        for t in range(1, y.shape[1]):
+            levels[:, t] = self.alpha * y[:, t] + (1 - self.alpha) * levels[:, t - 1]
+        return levels
+
+    def forecast(self, y, horizon):
+        return np.repeat(self._levels(y)[:, -1:], horizon, axis=1)
+
+    def one_step(self, y):
+        return self._levels(y)
+
+class SeasonalNaive:
+    min_history = 1
+
+    def __init__(self, season=12):
+        self.season = season
+
+    def forecast(self, y, horizon):
+        t = y.shape[1]
+        if t < self.season:
+            return np.repeat(y[:, -1:], horizon, axis=1)
+        return y[:, t - self.season + np.arange(horizon) % self.season]
+
+    def one_step(self, y):
+        t = y.shape[1]
+        steps = np.arange(1, t + 1)
+        source = np.where(steps >= self.season, steps - self.season, steps - 1)
+        return y[:, source]
+
+class LinearTrend:
+    min_history = 2
+
+    def forecast(self, y, horizon):
+        t = y.shape[1]
+        if t < 2:
+            return np.repeat(y[:, -1:], horizon, axis=1)
+        x = np.arange(t)
+        slope, intercept = np.polyfit(x, y.T, 1)
+        future = np.arange(t, t + horizon)
+        return np.clip(intercept[:, None] + slope[:, None] * future, 0, None)
+
+    def one_step(self, y):
+        # Expanding-window least squares for every cutoff at once, from running sums.
+        t = y.shape[1]
+        x = np.arange(t, dtype=float)
+        n = np.arange(1, t + 1, dtype=float)
+        sx, sxx = np.cumsum(x), np.cumsum(x * x)
+        sy, sxy = np.cumsum(y, axis=1), np.cumsum(y * x, axis=1)
+        denom = n * sxx - sx * sx
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(denom > 0, (n * sxy - sx * sy) / denom, 0.0)
+        intercept = (sy - slope * sx) / n
+        return np.clip(intercept + slope * (x + 1), 0, None)
+
+STRATEGIES = {
+    "moving_average": MovingAverage(),
+    "exponential_smoothing": ExponentialSmoothing(),
+    "seasonal_naive": SeasonalNaive(),
+    "linear_trend": LinearTrend(),
+}
+DEFAULT_STRATEGY = "moving_average"
+
+def forecast(rows, strategy=DEFAULT_STRATEGY, horizon=1, by_category=False):
+    months, categories, matrix = build_matrix(rows)
+    if not months:
+        return {"month": None, "forecast": 0.0, "strategy": strategy, "horizon": []}
+    model = STRATEGIES[strategy]
+    per_category = model.forecast(matrix, horizon)
+    total = model.forecast(matrix.sum(axis=0, keepdims=True), horizon)[0]
+    last = _month_index(months[-1])
+    future = [_month_label(last + i) for i in range(1, horizon + 1)]
+    result = {
+        "month": future[0],
+        "forecast": round(float(total[0]), 2),
+        "strategy": strategy,
+        "horizon": [{"month": m, "forecast": round(float(v), 2)} for m, v in zip(future, total)],
+    }
+    if by_category:
+        result["categories"] = {
+            c: [round(float(v), 2) for v in per_category[i]] for i, c in enumerate(categories)
+        }
+    return result
+
+def backtest(rows, min_history=3):
+    months, categories, matrix = build_matrix(rows)
+    series = np.vstack([matrix.sum(axis=0, keepdims=True), matrix]) if months else matrix
+    scores = {}
+    for name, model in STRATEGIES.items():
+        start = max(min_history, model.min_history)
+        if series.shape[1] <= start:
+            scores[name] = {"points": 0, "mae": None, "rmse": None, "mape": None, "category_mae": None}
+            continue
+        predicted = model.one_step(series)[:, start - 1:-1]
+        actual = series[:, start:]
+        error = predicted - actual
+        nonzero = actual[0] != 0
+        scores[name] = {
+            "points": int(actual.shape[1]),
+            "mae": round(float(np.abs(error[0]).mean()), 2),
+            "rmse": round(float(np.sqrt((error[0] ** 2).mean())), 2),
+            "mape": round(float(np.abs(error[0][nonzero] / actual[0][nonzero]).mean() * 100), 2) if nonzero.any() else None,
+            "category_mae": round(float(np.abs(error[1:]).mean()), 2) if len(categories) else None,
+        }
+    return {"months": len(months), "min_history": min_history, "strategies": scores}
@@ -0,0 +1,64 @@
+import hashlib
+from datetime import datetime, timedelta
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import cache, config, models
+
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+def fingerprint(method, path, body):
+    return hashlib.sha256(f"{method} {path}\n".encode() + body).hexdigest()
+
+def _cutoff():
+    return datetime.utcnow() - timedelta(hours=config.IDEMPOTENCY_TTL_HOURS)
+
+async def _stored(db: AsyncSession, user_id, key):
+    return (await db.execute(
+        select(models.IdempotencyKey.fingerprint, models.IdempotencyKey.status_code, models.IdempotencyKey.body)
+        .where(models.IdempotencyKey.user_id == user_id, models.IdempotencyKey.key == key,
+               models.IdempotencyKey.created_at >= _cutoff())
+    )).first()
+
+def _replay(stored, request_fingerprint):
+    if stored.fingerprint != request_fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return Response(stored.body, status_code=stored.status_code, media_type="application/json",
+                    headers={REPLAYED_HEADER: "true"})
+
+async def run(db: AsyncSession, request: Request, user_id, key, write, status_code=200):
+    # `write` makes its changes without committing. With a key, the response
+    # is stored in the same transaction, so a retry either finds it or
+    # finds nothing was written.
+    if key is None:
+        body = cache.dumps(await write())
+        await db.commit()
+        return Response(body, status_code=status_code, media_type="application/json")
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+    request_fingerprint = fingerprint(request.method, request.url.path, await request.body())
+    stored = await _stored(db, user_id, key)
+    if stored is not None:
+        return _replay(stored, request_fingerprint)
+
+    body = cache.dumps(await write())
+    try:
+        await db.execute(delete(models.IdempotencyKey).where(
+            models.IdempotencyKey.user_id == user_id, models.IdempotencyKey.created_at < _cutoff(),
+        ))
+        await db.execute(insert(models.IdempotencyKey).values(
+            user_id=user_id, key=key, fingerprint=request_fingerprint, status_code=status_code, body=body,
+            created_at=datetime.utcnow(),
+        ))
+        await db.commit()
+    except IntegrityError:
+        # A concurrent retry with the same key committed first. Its write
+        # stands; this one is rolled back and answers with its response.
+        await db.rollback()
+        stored = await _stored(db, user_id, key)
+        if stored is None:
+            raise
+        return _replay(stored, request_fingerprint)
+    return Response(body, status_code=status_code, media_type="application/json")
@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+from itertools import islice
+from types import SimpleNamespace
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app import models, schemas, ledger, classifier
+
+BATCH_SIZE = 1000
+
+def _error_message(e):
+    if isinstance(e, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+        )
+    return str(e)
+
+async def _fill_categories(records):
+    missing = [
+        r for r in records
+        if isinstance(r, dict) and not (r.get("category") or "").strip()
+        and isinstance(r.get("title"), str) and r["title"].strip()
+    ]
+    predicted = await run_in_threadpool(classifier.predict, [r["title"] for r in missing])
+    for record, category in zip(missing, predicted):
+        record["category"] = category
+
+async def insert_batch(db: AsyncSession, user_id, records, first_row=1):
+    await _fill_categories(records)
+    valid, errors = [], []
+    for row, record in enumerate(records, start=first_row):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("expected an object")
+            valid.append(schemas.ExpenseCreate(**record))
+        except (ValidationError, ValueError, TypeError) as e:
+            errors.append({"row": row, "error": _error_message(e)})
+    if valid:
+        rows = [{**e.dict(), "user_id": user_id} for e in valid]
+        ids = await db.scalars(insert(models.Expense).returning(models.Expense.id, sort_by_parameter_order=True), rows)
+        for row, expense_id in zip(rows, ids):
+            row["id"] = expense_id
+        await ledger.record(db, user_id, added=[SimpleNamespace(**r) for r in rows])
+        await db.commit()
+    return len(valid), errors
+
+async def ingest(db: AsyncSession, user_id, records, progress=None):
+    inserted, errors = 0, []
+    records = iter(records)
+    first_row = 1
+    while True:
+        batch = list(islice(records, BATCH_SIZE))
+        if not batch:
+            break
+        n, batch_errors = await insert_batch(db, user_id, batch, first_row)
+        inserted += n
+        errors.extend(batch_errors)
+        first_row += len(batch)
+        if progress is not None:
+            progress(first_row - 1)
+    return {"inserted": inserted, "errors": errors}
+
+def _ndjson_records(text):
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"invalid JSON: {e.msg}")
+
+def _valid_utf8(record):
+    # Undecodable bytes arrive as lone surrogates (see parse_upload), which
+    # don't encode back to UTF-8.
+    try:
+        for value in record.values():
+            if isinstance(value, str):
+                value.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def _checked(records):
+    # Earlier batches are already committed when a bad byte or a broken CSV
+    # line turns up, so these become row errors rather than a failed request.
+    records = iter(records)
+    while True:
+        try:
+            record = next(records)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield ValueError(f"malformed CSV: {e}")
+            continue
+        if isinstance(record, dict) and not _valid_utf8(record):
+            yield ValueError("invalid UTF-8")
+        else:
+            yield record
+
+def parse_upload(fileobj, filename="", content_type=""):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="surrogateescape", newline="")
+    if filename.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return _checked(_ndjson_records(text))
+    return _checked(csv.DictReader(text))
@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from pathlib import Path
+import orjson
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased
+from app import config, database, models
+
+# Training pulls in sklearn and pandas, so job handlers import their modules
+# inside the worker process rather than here.
+
+USER_KINDS = ("import", "backtest", "snapshot", "anomalies")
+GLOBAL_KINDS = ("train", "rollup_rebuild")
+PENDING = ("queued", "running")
+MAX_STORED_ERRORS = 1000
+PROGRESS_INTERVAL = 0.5
+# First key of the per-kind advisory locks taken while claiming on Postgres.
+ADVISORY_LOCK_CLASS = 0x4A4F42
+
+class TooManyJobs(Exception):
+    pass
+
+def limits():
+    parsed = {}
+    for part in config.JOB_LIMITS.split(","):
+        kind, _, value = part.partition("=")
+        if kind.strip() and value.strip():
+            parsed[kind.strip()] = int(value)
+    return parsed
+
+_wakeup = None
+
+def notify():
+    if _wakeup is not None:
+        _wakeup.set()
+
+async def submit(db: AsyncSession, kind, params=None, user_id=None):
+    if user_id is not None and config.JOB_MAX_PENDING_PER_USER > 0:
+        pending = await db.scalar(
+            select(func.count()).select_from(models.Job)
+            .where(models.Job.user_id == user_id, models.Job.status.in_(PENDING))
+        )
+        if pending >= config.JOB_MAX_PENDING_PER_USER:
+            raise TooManyJobs(pending)
+    job = models.Job(kind=kind, user_id=user_id, params=params or {}, status="queued", progress=0,
+                     created_at=datetime.utcnow())
+    db.add(job)
+    await db.commit()
+    notify()
+    return job
+
+async def get(db: AsyncSession, job_id, user_id):
+    return (await db.scalars(
+        select(models.Job).where(models.Job.id == job_id, models.Job.user_id == user_id)
+    )).first()
+
+async def recent(db: AsyncSession, user_id, limit=50):
+    return (await db.scalars(
+        select(models.Job).where(models.Job.user_id == user_id).order_by(models.Job.id.desc()).limit(limit)
+    )).all()
+
+async def cancel(db: AsyncSession, job_id, user_id):
+    # Only queued jobs: a running one may already have written part of its work.
+    job = await get(db, job_id, user_id)
+    if job is None or job.status != "queued":
+        return False
+    result = await db.execute(
+        update(models.Job).where(models.Job.id == job_id, models.Job.status == "queued")
+        .values(status="cancelled", finished_at=datetime.utcnow())
+    )
+    await db.commit()
+    if result.rowcount and job.kind == "import":
+        Path(job.params["path"]).unlink(missing_ok=True)
+    return bool(result.rowcount)
+
+def save_upload(fileobj):
+    path = Path(config.JOB_DIR) / f"{uuid.uuid4().hex}.upload"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(fileobj, f)
+    return path
+
+# Worker side: everything below runs in the pool's processes.
+
+class _Progress:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last = 0.0
+        self._pending = None
+
+    def __call__(self, done, total=None, message=None):
+        self._pending = {"progress": done}
+        if total is not None:
+            self._pending["total"] = total
+        if message is not None:
+            self._pending["message"] = message
+        if time.monotonic() - self._last >= PROGRESS_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self._pending is None:
+            return
+        with database.engine.begin() as conn:
+            conn.execute(update(models.Job).where(models.Job.id == self.job_id).values(**self._pending))
+        self._pending = None
+        self._last = time.monotonic()
+
+async def _import(db, user_id, params, progress):
+    from app import ingest
+    path = Path(params["path"])
+    try:
+        with open(path, "rb") as f:
+            records = ingest.parse_upload(f, params.get("filename", ""), params.get("content_type", ""))
+            result = await ingest.ingest(db, user_id, records, progress)
+    finally:
+        path.unlink(missing_ok=True)
+    errors = result["errors"]
+    return {"inserted": result["inserted"], "error_count": len(errors), "errors": errors[:MAX_STORED_ERRORS]}
+
+async def _backtest(db, user_id, params, progress):
+    from app import forecasting, rollup
+    return forecasting.backtest(await rollup.category_totals(db, user_id), params.get("min_history", 3))
+
+async def _snapshot(db, user_id, params, progress):
+    from app import analytics
+    written = await analytics.write_snapshot(db, user_id, force=params.get("force", False))
+    return written or {"user_id": user_id, "message": "Snapshot already current"}
+
+async def _anomalies(db, user_id, params, progress):
+    from app import anomalies
+    return await anomalies.backfill(db, user_id)
+
+async def _rollup_rebuild(db, user_id, params, progress):
+    from app import rollup
+    return {"rows": await rollup.rebuild(db)}
+
+def _train(user_id, params, progress):
+    from app import training
+    manifest = training.train(database.engine, full=params.get("full", False), progress=progress)
+    if manifest is None:
+        return {"version": None, "message": "No new labelled expenses; model unchanged"}
+    return {k: manifest.get(k) for k in ("version", "mode", "rows", "trained_through_seq")}
+
+HANDLERS = {
+    "import": _import,
+    "backtest": _backtest,
+    "snapshot": _snapshot,
+    "anomalies": _anomalies,
+    "rollup_rebuild": _rollup_rebuild,
+    "train": _train,
+}
+
+async def _with_session(handler, user_id, params, progress):
+    # A fresh engine per job: asyncpg connections can't outlive the event loop they were opened on.
+    engine = database.make_async_engine()
+    try:
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            return await handler(db, user_id, params, progress)
+    finally:
+        await engine.dispose()
+
+def _init_worker(nice):
+    # Lower priority so interactive requests win the CPU when both are busy.
+    if nice:
+        os.nice(nice)
+
+def execute(job_id, kind, user_id, params):
+    handler = HANDLERS[kind]
+    progress = _Progress(job_id)
+    if asyncio.iscoroutinefunction(handler):
+        result = asyncio.run(_with_session(handler, user_id, params, progress))
+    else:
+        result = handler(user_id, params, progress)
+    progress.flush()
+    # Round-trip so numpy scalars and dates come back as plain JSON values.
+    return orjson.loads(orjson.dumps(result, default=str, option=orjson.OPT_SERIALIZE_NUMPY))
+
+# Dispatcher side: runs in the API process (or `python -m app.jobs worker`).
+
+def _running_count(kind, job=models.Job):
+    return select(func.count()).select_from(job).where(job.status == "running", job.kind == kind)
+
+async def _claim_postgres(db: AsyncSession, candidates, caps):
+    for job in candidates:
+        cap = caps.get(job.kind)
+        if cap is not None:
+            # Held until commit, so dispatchers claim one kind at a time and
+            # the running count below can't change before the UPDATE lands.
+            locked = await db.scalar(select(func.pg_try_advisory_xact_lock(ADVISORY_LOCK_CLASS, func.hashtext(job.kind))))
+            if not locked or await db.scalar(_running_count(job.kind)) >= cap:
+                continue
+        now = datetime.utcnow()
+        await db.execute(update(models.Job).where(models.Job.id == job.id)
+                         .values(status="running", started_at=now, heartbeat_at=now))
+        await db.commit()
+        return job
+    await db.commit()
+    return None
+
+async def _claim_conditional(db: AsyncSession, candidates, caps):
+    # SQLite runs one writer at a time, so the cap can sit in the UPDATE
+    # itself: it only matches while the kind is below its limit.
+    for job in candidates:
+        stmt = update(models.Job).where(models.Job.id == job.id, models.Job.status == "queued")
+        cap = caps.get(job.kind)
+        if cap is not None:
+            stmt = stmt.where(_running_count(job.kind, aliased(models.Job)).scalar_subquery() < cap)
+        now = datetime.utcnow()
+        claimed = await db.execute(stmt.values(status="running", started_at=now, heartbeat_at=now))
+        await db.commit()
+        if claimed.rowcount == 1:
+            return job
+    return None
+
+async def claim(db: AsyncSession):
+    caps = limits()
+    running = dict((await db.execute(
+        select(models.Job.kind, func.count()).where(models.Job.status == "running").group_by(models.Job.kind)
+    )).all())
+    # Only a hint that keeps full kinds from crowding out the rest of the
+    # queue; the cap itself is enforced when the row is claimed.
+    saturated = [kind for kind, cap in caps.items() if running.get(kind, 0) >= cap]
+    stmt = select(models.Job.id, models.Job.kind, models.Job.user_id, models.Job.params) \
+        .where(models.Job.status == "queued")
+    if saturated:
+        stmt = stmt.where(models.Job.kind.not_in(saturated))
+    stmt = stmt.order_by(models.Job.id).limit(10)
+    if database.dialect_name(db) == "postgresql":
+        candidates = (await db.execute(stmt.with_for_update(skip_locked=True))).all()
+        return await _claim_postgres(db, candidates, caps)
+    candidates = (await db.execute(stmt)).all()
+    return await _claim_conditional(db, candidates, caps)
+
+async def _finish(db: AsyncSession, job_id, future):
+    try:
+        values = {"status": "succeeded", "result": future.result()}
+    except Exception as e:
+        values = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    await db.execute(update(models.Job).where(models.Job.id == job_id)
+                     .values(**values, finished_at=datetime.utcnow()))
+    await db.commit()
+
+async def _heartbeat(db: AsyncSession, job_ids):
+    now = datetime.utcnow()
+    if job_ids:
+        await db.execute(update(models.Job).where(models.Job.id.in_(job_ids)).values(heartbeat_at=now))
+    # Jobs whose dispatcher died (restart, crash) stop getting heartbeats.
+    await db.execute(
+        update(models.Job)
+        .where(models.Job.status == "running",
+               models.Job.heartbeat_at < now - timedelta(seconds=config.JOB_STALE_SECONDS))
+        .values(status="failed", error="Worker lost before the job finished", finished_at=now)
+    )
+    await db.commit()
+
+async def dispatch(workers=None, poll=None):
+    global _wakeup
+    workers = workers or config.JOB_WORKERS
+    poll = poll or config.JOB_POLL_SECONDS
+    loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    # spawn, not fork: the children must not share this process's event loop or DB connections.
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                   initializer=_init_worker, initargs=(config.JOB_NICE,))
+    running = {}
+    try:
+        while True:
+            _wakeup.clear()
+            try:
+                async with database.AsyncSessionLocal() as db:
+                    for job_id in [j for j, f in running.items() if f.done()]:
+                        await _finish(db, job_id, running.pop(job_id))
+                    await _heartbeat(db, list(running))
+                    while len(running) < workers:
+                        job = await claim(db)
+                        if job is None:
+                            break
+                        future = loop.run_in_executor(executor, execute, job.id, job.kind, job.user_id, job.params)
+                        future.add_done_callback(lambda _: notify())
+                        running[job.id] = future
+            except Exception:
+                # The database is unreachable; try again on the next tick.
+                pass
+            try:
+                await asyncio.wait_for(_wakeup.wait(), poll)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _wakeup = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+async def _submit_cli(kind, params):
+    try:
+        async with database.AsyncSessionLocal() as db:
+            job = await submit(db, kind, params)
+            return job.id
+    finally:
+        await database.async_engine.dispose()
+
+async def _list_cli(limit):
+    try:
+        async with database.AsyncSessionLocal() as db:
+            return (await db.scalars(select(models.Job).order_by(models.Job.id.desc()).limit(limit))).all()
+    finally:
+        await database.async_engine.dispose()
+
+async def _background(workers, snapshot_seconds):
+    # The host's one process for background work when the API runs several
+    # workers (see gunicorn.conf.py).
+    from app import analytics
+    tasks = []
+    if workers > 0:
+        tasks.append(dispatch(workers))
+    if snapshot_seconds > 0:
+        tasks.append(analytics.compact_periodically(snapshot_seconds))
+    await asyncio.gather(*tasks)
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.jobs", description="Background job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="run jobs from the queue until interrupted")
+    worker.add_argument("--workers", type=int, default=config.JOB_WORKERS or 1,
+                        help="job processes (0 runs no jobs, only snapshot compaction)")
+    worker.add_argument("--snapshot-seconds", type=float, default=config.ANALYTICS_SNAPSHOT_SECONDS,
+                        help="also re-snapshot changed users' analytics on this interval (0: off)")
+    submit_cmd = commands.add_parser("submit", help="queue a maintenance job")
+    submit_cmd.add_argument("kind", choices=GLOBAL_KINDS)
+    submit_cmd.add_argument("--full", action="store_true", help="train: retrain from scratch")
+    listing = commands.add_parser("list", help="show recent jobs")
+    listing.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        try:
+            asyncio.run(_background(args.workers, args.snapshot_seconds))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.command == "submit":
+        params = {"full": args.full} if args.kind == "train" else {}
+        print(f"Queued {args.kind} as job {asyncio.run(_submit_cli(args.kind, params))}")
+        return 0
+    for job in asyncio.run(_list_cli(args.limit)):
+        done = f"{job.progress}/{job.total}" if job.total else str(job.progress)
+        print(f"{job.id:>6}  {job.kind:<15} {job.status:<10} {done:>12}  user={job.user_id}  {job.error or ''}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,21 @@
+from types import SimpleNamespace
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import anomalies, changes, rollup, versioning
+
+COLUMNS = ("id", "user_id", "title", "amount", "category", "date")
+
+def snapshot(expense):
+    return SimpleNamespace(**{c: getattr(expense, c) for c in COLUMNS})
+
+async def record(db: AsyncSession, user_id, added=(), removed=(), bump=True):
+    # The user's data_version row is always locked before monthly_totals, so
+    # two writes by one user can't deadlock on each other's rollup rows.
+    # Callers that pass bump=False have already bumped.
+    if bump:
+        await versioning.bump(db, user_id)
+    if removed:
+        await rollup.apply(db, removed, -1)
+    if added:
+        await rollup.apply(db, added, 1)
+    await changes.record(db, user_id, added, removed)
+    await anomalies.record(db, user_id, added, removed)
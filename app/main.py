@@ -1,75 +1,481 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app import models, schemas, database
-from datetime import datetime
-import pandas as pd
+import asyncio
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Body, UploadFile, File, Request, Header
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app import models, schemas, database, config, metrics, rollup, ledger, forecasting, budgets, cache, summary, pagination, ingest, classifier, analytics, auth, jobs, changes, anomalies, bulk, idempotency
+from datetime import date
+from typing import Optional
 
-app = FastAPI()
-models.Base.metadata.create_all(bind=database.engine)
+router = APIRouter(route_class=metrics.InstrumentedRoute)
 
-def get_db():
-    db = database.SessionLocal()
+def create_app(preload_model=False):
+    # Builds the app without touching the database, so a server can call this
+    # in its parent process and fork workers from it (see gunicorn.conf.py).
+    # With preload_model the classifier loads here too, and the workers share
+    # its pages instead of each loading a copy.
+    auth.check_secret()
+    app = FastAPI()
+    cache.configure_from_env()
+    metrics.instrument_engine(database.async_engine.sync_engine)
+    if preload_model:
+        classifier.load()
+
+    @app.middleware("http")
+    async def record_metrics(request: Request, call_next):
+        return await metrics.metrics_middleware(request, call_next, config.PROFILING_ENABLED)
+
+    @app.on_event("startup")
+    async def create_schema():
+        if not config.AUTO_CREATE_SCHEMA:
+            return
+        async with database.async_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+
+    @app.on_event("startup")
+    async def load_classifier():
+        # Load in the background so the API can serve before sklearn finishes importing.
+        if not classifier.loaded():
+            asyncio.get_running_loop().run_in_executor(None, classifier.load)
+        if config.MODEL_POLL_SECONDS > 0:
+            app.state.model_watcher = asyncio.create_task(classifier.watch())
+
+    @app.on_event("startup")
+    async def start_snapshot_compaction():
+        if config.ANALYTICS_SNAPSHOT_SECONDS > 0:
+            app.state.snapshot_compactor = asyncio.create_task(analytics.compact_periodically())
+
+    @app.on_event("startup")
+    async def start_job_dispatcher():
+        if config.JOB_WORKERS > 0:
+            app.state.job_dispatcher = asyncio.create_task(jobs.dispatch())
+
+    @app.on_event("startup")
+    async def start_change_listener():
+        if config.CHANGE_NOTIFY and database.async_engine.dialect.name == "postgresql":
+            app.state.change_listener = asyncio.create_task(changes.listen())
+
+    @app.on_event("shutdown")
+    async def dispose_engine():
+        for name in ("model_watcher", "snapshot_compactor", "job_dispatcher", "change_listener"):
+            task = getattr(app.state, name, None)
+            if task is not None:
+                task.cancel()
+        await database.async_engine.dispose()
+
+    app.include_router(router)
+    return app
+
+def __getattr__(name):
+    # `uvicorn app.main:app` keeps working: the module-level app is built on
+    # first access rather than at import.
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def check_fields(fields: Optional[str]):
     try:
-        yield db
-    finally:
-        db.close()
-
-@app.post("/expenses/", response_model=schemas.Expense)
-def create_expense(expense: schemas.ExpenseCreate, db: Session = Depends(get_db)):
-    db_expense = models.Expense(**expense.dict())
-    db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
-    return db_expense
-
-@app.get("/expenses/", response_model=list[schemas.Expense])
-def read_expenses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Expense).offset(skip).limit(limit).all()
-
-@app.put("/expenses/{expense_id}", response_model=schemas.Expense)
-def update_expense(expense_id: int, updated: schemas.ExpenseCreate, db: Session = Depends(get_db)):
-    exp = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
-    if not exp:
+        return pagination.parse_fields(fields)
+    except pagination.InvalidFields:
+        raise HTTPException(status_code=400, detail=f"fields must be a subset of {','.join(pagination.EXPORT_COLUMNS)}")
+
+def check_selector(selector: schemas.ExpenseSelector):
+    if selector.ids is None and selector.start is None and selector.end is None and selector.category is None:
+        raise HTTPException(status_code=400, detail="pass ids or at least one of start, end, category")
+    if selector.ids is not None and not 1 <= len(selector.ids) <= bulk.MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"ids must hold between 1 and {bulk.MAX_IDS} values")
+    return {"ids": selector.ids, "start": selector.start, "end": selector.end, "category": selector.category}
+
+async def run_bulk(write):
+    try:
+        return await write
+    except bulk.TooManyRows as exc:
+        raise HTTPException(status_code=400,
+                            detail=f"{exc.args[0]} expenses match; narrow the filter to {config.BULK_MAX_ROWS} or fewer")
+
+@router.post("/auth/register", response_model=schemas.User, status_code=201)
+async def register(credentials: schemas.Credentials, db: AsyncSession = Depends(get_db)):
+    if not credentials.username.strip():
+        raise HTTPException(status_code=400, detail="username must not be empty")
+    if len(credentials.password) < auth.MIN_PASSWORD_LENGTH:
+        raise HTTPException(status_code=400, detail=f"password must be at least {auth.MIN_PASSWORD_LENGTH} characters")
+    try:
+        user = await auth.create_user(db, credentials.username.strip(), credentials.password)
+    except auth.UsernameTaken:
+        raise HTTPException(status_code=409, detail="Username already taken")
+    return {"id": user.id, "username": user.username}
+
+@router.post("/auth/token", response_model=schemas.Token)
+async def login(credentials: schemas.Credentials, db: AsyncSession = Depends(get_db)):
+    user = await auth.authenticate(db, credentials.username.strip(), credentials.password)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Incorrect username or password",
+                            headers={"WWW-Authenticate": "Bearer"})
+    token, expires_at = auth.issue_token(user.id)
+    return {"access_token": token, "token_type": "bearer", "expires_at": expires_at}
+
+@router.post("/expenses/", response_model=schemas.Expense)
+async def create_expense(request: Request, expense: schemas.ExpenseCreate,
+                         idempotency_key: Optional[str] = Header(None),
+                         user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    async def write():
+        db_expense = models.Expense(**expense.dict(), user_id=user_id)
+        db.add(db_expense)
+        await ledger.record(db, user_id, added=[db_expense])
+        return {c: getattr(db_expense, c) for c in pagination.EXPORT_COLUMNS}
+
+    return await idempotency.run(db, request, user_id, idempotency_key, write)
+
+@router.patch("/expenses/")
+async def update_expenses(request: Request, patch: schemas.ExpensePatch,
+                          idempotency_key: Optional[str] = Header(None),
+                          user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    selector = check_selector(patch)
+    values = patch.set.dict(exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="set must name at least one field")
+
+    async def write():
+        items = await run_bulk(bulk.update_expenses(db, user_id, values, **selector))
+        return {"updated": len(items), "items": items}
+
+    return await idempotency.run(db, request, user_id, idempotency_key, write)
+
+@router.delete("/expenses/")
+async def delete_expenses(request: Request, selector: schemas.ExpenseSelector,
+                          idempotency_key: Optional[str] = Header(None),
+                          user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    selector = check_selector(selector)
+
+    async def write():
+        ids = await run_bulk(bulk.delete_expenses(db, user_id, **selector))
+        return {"deleted": len(ids), "ids": ids}
+
+    return await idempotency.run(db, request, user_id, idempotency_key, write)
+
+@router.post("/expenses/bulk", response_model=schemas.BulkResult)
+async def create_expenses_bulk(expenses: list = Body(...),
+                               user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await ingest.ingest(db, user_id, expenses)
+
+@router.post("/expenses/upload", response_model=schemas.BulkResult)
+async def upload_expenses(file: UploadFile = File(...),
+                          user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    records = ingest.parse_upload(file.file, file.filename or "", file.content_type or "")
+    return await ingest.ingest(db, user_id, records)
+
+@router.get("/expenses/", response_model=list[schemas.Expense])
+async def read_expenses(request: Request, skip: int = 0, limit: int = 100, start: Optional[date] = None,
+                        end: Optional[date] = None, category: Optional[str] = None, fields: Optional[str] = None,
+                        user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    fields = check_fields(fields)
+    stmt = pagination.select_fields(fields).where(models.Expense.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(models.Expense.date >= start)
+    if end is not None:
+        stmt = stmt.where(models.Expense.date <= end)
+    if category is not None:
+        stmt = stmt.where(models.Expense.category == category)
+
+    async def compute():
+        rows = (await db.execute(stmt.offset(skip).limit(limit))).all()
+        return pagination.to_dicts(rows, fields)
+
+    return await cache.respond(request, db, user_id, compute)
+
+@router.get("/expenses/page", response_model=schemas.ExpensePage)
+async def read_expenses_page(request: Request, limit: int = 100, cursor: Optional[str] = None,
+                             start: Optional[date] = None, end: Optional[date] = None,
+                             category: Optional[str] = None, fields: Optional[str] = None,
+                             user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    if cursor:
+        try:
+            pagination.decode_cursor(cursor)
+        except pagination.InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    fields = check_fields(fields)
+
+    async def compute():
+        return await pagination.page(db, user_id, limit, cursor, start, end, category, fields)
+
+    return await cache.respond(request, db, user_id, compute)
+
+@router.get("/expenses/changes", response_model=schemas.ChangeFeed)
+async def read_changes(request: Request, since: Optional[int] = None, limit: int = 1000,
+                       user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    if since is None:
+        # No cursor yet: start from now. Load the data, then poll from `next`.
+        return {"changes": [], "next": await changes.latest(db, user_id), "more": False}
+
+    async def compute():
+        try:
+            batch = await changes.since(db, user_id, since, limit)
+        except changes.Expired:
+            raise HTTPException(status_code=410, detail="since is older than the retained changes; reload and start over")
+        return {"changes": batch, "next": batch[-1]["seq"] if batch else since, "more": len(batch) == limit}
+
+    return await cache.respond(request, db, user_id, compute)
+
+@router.get("/expenses/changes/stream")
+async def stream_changes(request: Request, since: Optional[int] = None,
+                         user_id: int = Depends(auth.streaming_user)):
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        if not last_event_id.isdigit():
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be a change seq")
+        since = int(last_event_id)
+    if since is None:
+        # A session of its own, closed before streaming, so an open stream holds no pooled connection.
+        async with database.AsyncSessionLocal() as db:
+            since = await changes.latest(db, user_id)
+    return StreamingResponse(
+        changes.stream(user_id, since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/expenses/flags", response_model=list[schemas.Flag])
+async def read_flags(kind: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None,
+                     limit: int = 100, user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if kind is not None and kind not in anomalies.KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(anomalies.KINDS)}")
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    return await anomalies.flagged(db, user_id, kind, start, end, limit)
+
+@router.post("/expenses/export/link")
+async def export_link(user_id: int = Depends(auth.current_user)):
+    # A short-lived token for /expenses/export?token=..., for clients that
+    # hand the download to a browser and can't set the Authorization header.
+    token, expires_at = auth.issue_token(user_id, config.LINK_TTL_SECONDS, scope="/expenses/export")
+    return {"token": token, "expires_at": expires_at}
+
+@router.get("/expenses/export")
+async def export_expenses(format: str = "csv", start: Optional[date] = None, end: Optional[date] = None,
+                          user_id: int = Depends(auth.streaming_user)):
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        pagination.stream_export(format, user_id, start, end),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="expenses.{format}"'},
+    )
+
+@router.get("/expenses/summary")
+async def summary_overview(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                           user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await cache.respond(request, db, user_id, lambda: summary.overview(db, user_id, start, end))
+
+@router.get("/expenses/summary/range")
+async def summary_range(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                        user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await cache.respond(request, db, user_id, lambda: summary.date_range(db, user_id, start, end))
+
+@router.get("/expenses/summary/monthly")
+async def summary_monthly(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                          user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await cache.respond(request, db, user_id, lambda: summary.by_month(db, user_id, start, end))
+
+@router.get("/expenses/summary/weekly")
+async def summary_weekly(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                         user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await cache.respond(request, db, user_id, lambda: summary.by_week(db, user_id, start, end))
+
+@router.get("/expenses/summary/category")
+async def summary_category(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                           user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await cache.respond(request, db, user_id, lambda: summary.by_category(db, user_id, start, end))
+
+@router.get("/expenses/summary/daily")
+async def summary_daily(request: Request, start: Optional[date] = None, end: Optional[date] = None,
+                        user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await cache.respond(request, db, user_id, lambda: summary.by_day(db, user_id, start, end))
+
+@router.get("/expenses/analytics/{view}")
+async def expense_analytics(request: Request, view: str, start: Optional[date] = None, end: Optional[date] = None,
+                            format: Optional[str] = None,
+                            user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if view not in analytics.VIEWS:
+        raise HTTPException(status_code=404, detail=f"view must be one of {', '.join(analytics.VIEWS)}")
+    if format not in (None, "json", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be json or arrow")
+    arrow = format == "arrow" or (format is None and analytics.ARROW_MEDIA_TYPE in request.headers.get("accept", ""))
+
+    async def compute():
+        table = await analytics.load_table(db, user_id, start, end)
+        with metrics.timed("aggregate"):
+            result = await run_in_threadpool(analytics.aggregate, table, view)
+        return result if arrow else analytics.to_records(result, view)
+
+    if arrow:
+        response = await cache.respond(request, db, user_id, compute, analytics.to_ipc, analytics.ARROW_MEDIA_TYPE)
+    else:
+        response = await cache.respond(request, db, user_id, compute)
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    return response
+
+@router.put("/expenses/{expense_id}", response_model=schemas.Expense)
+async def update_expense(expense_id: int, updated: schemas.ExpenseCreate,
+                         user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    items = await bulk.update_expenses(db, user_id, updated.dict(), ids=[expense_id])
+    if not items:
         raise HTTPException(status_code=404, detail="Expense not found")
-    for key, value in updated.dict().items():
-        setattr(exp, key, value)
-    db.commit()
-    db.refresh(exp)
-    return exp
-
-@app.delete("/expenses/{expense_id}")
-def delete_expense(expense_id: int, db: Session = Depends(get_db)):
-    exp = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
-    if not exp:
+    await db.commit()
+    return items[0]
+
+@router.delete("/expenses/{expense_id}")
+async def delete_expense(expense_id: int,
+                         user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if not await bulk.delete_expenses(db, user_id, ids=[expense_id]):
         raise HTTPException(status_code=404, detail="Expense not found")
-    db.delete(exp)
-    db.commit()
+    await db.commit()
     return {"detail": "Deleted"}
 
-@app.get("/expenses/forecast")
-def forecast_expense(db: Session = Depends(get_db)):
-    expenses = db.query(models.Expense).all()
-    if not expenses:
-        return {"month": None, "forecast": 0.0}
+@router.get("/expenses/forecast")
+async def forecast_expense(request: Request, strategy: str = forecasting.DEFAULT_STRATEGY, horizon: int = 1,
+                           by_category: bool = False,
+                           user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if strategy not in forecasting.STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"strategy must be one of {', '.join(forecasting.STRATEGIES)}")
+    if not 1 <= horizon <= 24:
+        raise HTTPException(status_code=400, detail="horizon must be between 1 and 24")
 
-    data = [{
-        "amount": e.amount,
-        "date": e.date
-    } for e in expenses]
+    async def compute():
+        rows = await rollup.category_totals(db, user_id)
+        with metrics.timed("forecast"):
+            return forecasting.forecast(rows, strategy, horizon, by_category)
 
-    df = pd.DataFrame(data)
-    df['date'] = pd.to_datetime(df['date'])
-    df['month'] = df['date'].dt.to_period('M')
+    return await cache.respond(request, db, user_id, compute)
 
-    monthly_sums = df.groupby('month')['amount'].sum().reset_index()
-    monthly_sums['month'] = monthly_sums['month'].dt.to_timestamp()
+@router.get("/expenses/forecast/backtest")
+async def forecast_backtest(request: Request, min_history: int = 3,
+                            user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if min_history < 1:
+        raise HTTPException(status_code=400, detail="min_history must be at least 1")
 
-    if len(monthly_sums) >= 3:
-        forecast_value = monthly_sums['amount'].tail(3).mean()
-    else:
-        forecast_value = monthly_sums['amount'].iloc[-1]
+    async def compute():
+        rows = await rollup.category_totals(db, user_id)
+        with metrics.timed("backtest"):
+            return forecasting.backtest(rows, min_history)
+
+    return await cache.respond(request, db, user_id, compute)
+
+def check_month(month: str):
+    if not budgets.valid_month(month):
+        raise HTTPException(status_code=400, detail="month must be formatted YYYY-MM")
+
+@router.get("/budgets", response_model=list[schemas.Budget])
+async def read_budgets(month: Optional[str] = None,
+                       user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    month = month or date.today().strftime("%Y-%m")
+    check_month(month)
+    return await budgets.for_month(db, user_id, month)
+
+@router.put("/budgets/{month}", response_model=schemas.Budget)
+async def set_budget(month: str, budget: schemas.BudgetIn,
+                     user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    check_month(month)
+    if budget.amount < 0:
+        raise HTTPException(status_code=400, detail="amount must not be negative")
+    return await budgets.set_budget(db, user_id, month, budget.amount, budget.category)
+
+@router.delete("/budgets/{month}")
+async def delete_budget(month: str, category: str = "",
+                        user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    check_month(month)
+    if not await budgets.delete_budget(db, user_id, month, category):
+        raise HTTPException(status_code=404, detail="Budget not found")
+    return {"detail": "Deleted"}
+
+@router.get("/budget/status", response_model=schemas.BudgetStatus)
+async def budget_status(month: Optional[str] = None, amount: float = 0.0, category: str = "",
+                        user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    month = month or date.today().strftime("%Y-%m")
+    check_month(month)
+    return await budgets.status(db, user_id, month, amount, category)
+
+@router.post("/categorize", response_model=schemas.CategorizeResponse)
+async def categorize(request: schemas.CategorizeRequest, user_id: int = Depends(auth.current_user)):
+    titles = ([request.title] if request.title is not None else []) + request.titles
+    if not titles:
+        raise HTTPException(status_code=400, detail="Provide title or titles")
+    if request.k < 1:
+        raise HTTPException(status_code=400, detail="k must be at least 1")
+    await classifier.wait_loaded()
+    ranked = await classifier.get_batcher().rank(titles)
+    return {"results": [
+        {
+            "title": title,
+            "category": scores[0][0],
+            "candidates": [{"category": c, "probability": round(p, 4)} for c, p in scores[:request.k]],
+        }
+        for title, scores in zip(titles, ranked)
+    ]}
+
+@router.get("/categorize/stats")
+async def categorize_stats(user_id: int = Depends(auth.current_user)):
+    await classifier.wait_loaded()
+    return {**classifier.get_classifier().stats(), "model_version": classifier.version()}
+
+async def submit_job(db: AsyncSession, user_id: int, kind: str, params: dict):
+    try:
+        return await jobs.submit(db, kind, params, user_id)
+    except jobs.TooManyJobs:
+        raise HTTPException(status_code=429, detail=f"At most {config.JOB_MAX_PENDING_PER_USER} jobs may be queued or running")
+
+@router.post("/jobs/import", response_model=schemas.Job, status_code=202)
+async def submit_import(file: UploadFile = File(...),
+                        user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    path = await run_in_threadpool(jobs.save_upload, file.file)
+    params = {"path": str(path), "filename": file.filename or "", "content_type": file.content_type or ""}
+    try:
+        return await submit_job(db, user_id, "import", params)
+    except HTTPException:
+        path.unlink(missing_ok=True)
+        raise
+
+@router.post("/jobs/backtest", response_model=schemas.Job, status_code=202)
+async def submit_backtest(min_history: int = 3,
+                          user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if min_history < 1:
+        raise HTTPException(status_code=400, detail="min_history must be at least 1")
+    return await submit_job(db, user_id, "backtest", {"min_history": min_history})
+
+@router.post("/jobs/snapshot", response_model=schemas.Job, status_code=202)
+async def submit_snapshot(force: bool = False,
+                          user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await submit_job(db, user_id, "snapshot", {"force": force})
+
+@router.post("/jobs/anomalies", response_model=schemas.Job, status_code=202)
+async def submit_anomaly_scan(user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await submit_job(db, user_id, "anomalies", {})
+
+@router.get("/jobs", response_model=list[schemas.Job])
+async def read_jobs(limit: int = 50, user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    return await jobs.recent(db, user_id, min(max(limit, 1), 500))
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+async def read_job(job_id: int, user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    job = await jobs.get(db, job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-    last_month = monthly_sums['month'].max()
-    next_month = (last_month + pd.offsets.MonthBegin(1)).strftime('%Y-%m')
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: int, user_id: int = Depends(auth.current_user), db: AsyncSession = Depends(get_db)):
+    if await jobs.cancel(db, job_id, user_id):
+        return {"detail": "Cancelled"}
+    if await jobs.get(db, job_id, user_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    raise HTTPException(status_code=409, detail="Only queued jobs can be cancelled")
 
-    return {"month": next_month, "forecast": round(float(forecast_value), 2)}
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return metrics.metrics_response()
@@ -0,0 +1,185 @@
+import asyncio
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries issued per request",
+    ["route"], buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+SECTION_DURATION = Histogram(
+    "app_section_duration_seconds", "Time spent in instrumented hot-path sections",
+    ["section", "route"], buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Database statement execution time",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Database statements that raised", ["operation"])
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting for a pooled connection", buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool", multiprocess_mode="livesum",
+)
+CLASSIFIER_INFERENCE = Histogram(
+    "classifier_inference_seconds", "Category classifier predict_proba time", buckets=LATENCY_BUCKETS,
+)
+CLASSIFIER_BATCH_SIZE = Histogram(
+    "classifier_batch_size", "Titles per classifier model call", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 1024),
+)
+RESPONSE_CACHE = Counter("response_cache_requests_total", "Cached-response lookups by result", ["result"])
+
+_request_stats = ContextVar("request_stats", default=None)
+
+def _route_label(request: Request):
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+@contextmanager
+def timed(section):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = _request_stats.get()
+        route = stats["route"] if stats else ""
+        SECTION_DURATION.labels(section, route).observe(elapsed)
+        if stats is not None:
+            stats["sections"][section] = stats["sections"].get(section, 0.0) + elapsed
+
+def _mark_route(path):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats["route"] = path
+
+class InstrumentedRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed_endpoint(*args, **kw):
+                _mark_route(path)
+                with timed("handler"):
+                    return await endpoint(*args, **kw)
+        else:
+            @functools.wraps(endpoint)
+            def timed_endpoint(*args, **kw):
+                _mark_route(path)
+                with timed("handler"):
+                    return endpoint(*args, **kw)
+
+        super().__init__(path, timed_endpoint, **kwargs)
+
+def _operation(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+
+_instrumented = set()
+
+def instrument_engine(engine):
+    # Each app built by main.create_app calls this; listeners go on once.
+    if engine in _instrumented:
+        return
+    _instrumented.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_DURATION.labels(_operation(statement)).observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["queries"] += 1
+            stats["db_seconds"] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+        DB_QUERY_ERRORS.labels(_operation(context.statement or "")).inc()
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+@contextmanager
+def pool_checkout():
+    started = time.perf_counter()
+    yield
+    DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+def _profile_response(profiler, response):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+    return Response(
+        out.getvalue(), media_type="text/plain",
+        headers={"X-Profile-Status": str(response.status_code)},
+    )
+
+async def metrics_middleware(request: Request, call_next, profiling_enabled=False):
+    stats = {"route": "", "queries": 0, "db_seconds": 0.0, "sections": {}}
+    token = _request_stats.set(stats)
+    profiler = None
+    if profiling_enabled and request.headers.get("X-Profile") == "1":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _request_stats.reset(token)
+    elapsed = time.perf_counter() - started
+    route = _route_label(request)
+    REQUEST_LATENCY.labels(request.method, route, str(response.status_code)).observe(elapsed)
+    REQUEST_QUERIES.labels(route).observe(stats["queries"])
+    if "handler" in stats["sections"]:
+        SECTION_DURATION.labels("serialization", route).observe(max(0.0, elapsed - stats["sections"]["handler"]))
+    response.headers["Server-Timing"] = (
+        f'app;dur={elapsed * 1000:.2f}, db;dur={stats["db_seconds"] * 1000:.2f};desc="{stats["queries"]} queries"'
+    )
+    if profiler is not None:
+        return _profile_response(profiler, response)
+    return response
+
+def _registry():
+    # Under several workers each process writes its samples to
+    # PROMETHEUS_MULTIPROC_DIR, and a scrape of any worker sums them all.
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    from prometheus_client import multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def mark_process_dead(pid):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+def metrics_response():
+    return Response(generate_latest(_registry()), media_type=CONTENT_TYPE_LATEST)
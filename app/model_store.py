@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+import joblib
+from app import config, compact_model
+
+MANIFEST_NAME = "current.json"
+KEEP_VERSIONS = 5
+
+def model_dir():
+    return Path(config.MODEL_DIR)
+
+def read_manifest():
+    try:
+        with open(model_dir() / MANIFEST_NAME) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def current_version():
+    manifest = read_manifest()
+    return manifest["version"] if manifest else None
+
+def artifact_path(manifest):
+    return model_dir() / manifest["artifact"]
+
+def state_path(manifest):
+    # The estimator pickle partial_fit resumes from; for npy artifacts it sits
+    # beside the arrays and is never loaded by the API.
+    return model_dir() / manifest.get("state", manifest["artifact"])
+
+def _atomic_write(path: Path, write):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+def _publish_npy(directory, name, model):
+    tmp = Path(tempfile.mkdtemp(dir=directory, prefix=f".{name}."))
+    try:
+        compact_model.export(model, tmp)
+        joblib.dump(model, tmp / "pipeline.pkl")
+        os.rename(tmp, directory / name)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+def publish(model, format="npy", **metadata):
+    directory = model_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    version = (current_version() or 0) + 1
+    extra = {}
+    if format == "npy":
+        artifact = f"category_classifier-v{version:04d}"
+        _publish_npy(directory, artifact, model)
+        extra["state"] = f"{artifact}/pipeline.pkl"
+    else:
+        artifact = f"category_classifier-v{version:04d}.pkl"
+        _atomic_write(directory / artifact, lambda f: joblib.dump(model, f))
+    manifest = {
+        "version": version,
+        "artifact": artifact,
+        "format": format,
+        **extra,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        **metadata,
+    }
+    _atomic_write(directory / MANIFEST_NAME, lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+    prune()
+    return manifest
+
+def prune(keep=KEEP_VERSIONS):
+    manifest = read_manifest()
+    current = manifest["artifact"] if manifest else None
+    artifacts = sorted(model_dir().glob("category_classifier-v*"))
+    for path in artifacts[:-keep]:
+        if path.name == current:
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
@@ -1,11 +1,101 @@
-from sqlalchemy import Column, Integer, String, Float, Date
-from datetime import date
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, DateTime, Index, ForeignKey, JSON, Text, LargeBinary
+from datetime import date, datetime
 from .database import Base
 
+class User(Base):
+    __tablename__ = "users"
+    id = Column(Integer, primary_key=True)
+    username = Column(String, nullable=False, unique=True)
+    password_hash = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 class Expense(Base):
     __tablename__ = "expenses"
     id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String)
     amount = Column(Float)
     category = Column(String)
     date = Column(Date, default=date.today)
+
+    __table_args__ = (
+        Index("ix_expenses_user_date_id", "user_id", "date", "id"),
+        Index("ix_expenses_user_category_date_id", "user_id", "category", "date", "id"),
+        Index("ix_expenses_user_date_category_amount", "user_id", "date", "category", "amount"),
+        Index("ix_expenses_user_amount", "user_id", "amount"),
+    )
+
+class MonthlyTotal(Base):
+    __tablename__ = "monthly_totals"
+    user_id = Column(Integer, primary_key=True)
+    month = Column(String(7), primary_key=True)
+    category = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+class Budget(Base):
+    __tablename__ = "budgets"
+    user_id = Column(Integer, primary_key=True)
+    month = Column(String(7), primary_key=True)
+    category = Column(String, primary_key=True, default="")
+    amount = Column(Float, nullable=False)
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+    user_id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")
+    params = Column(JSON, nullable=False, default=dict)
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    message = Column(String)
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_jobs_status_id", "status", "id"),
+        Index("ix_jobs_user_id_id", "user_id", "id"),
+    )
+
+class ExpenseChange(Base):
+    __tablename__ = "expense_changes"
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    expense_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    before = Column(JSON)
+    after = Column(JSON)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_expense_changes_user_id_seq", "user_id", "seq"),
+    )
+
+class ExpenseFlag(Base):
+    __tablename__ = "expense_flags"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    expense_id = Column(Integer, primary_key=True)
+    kind = Column(String, primary_key=True)
+    score = Column(Float)
+    related_id = Column(Integer)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,93 @@
+import base64
+import binascii
+import csv
+import io
+import json
+from datetime import date
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, database
+
+EXPORT_COLUMNS = ("id", "title", "amount", "category", "date")
+EXPORT_CHUNK_SIZE = 1000
+
+class InvalidCursor(ValueError):
+    pass
+
+class InvalidFields(ValueError):
+    pass
+
+def parse_fields(fields=None):
+    if not fields:
+        return EXPORT_COLUMNS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not names or any(name not in EXPORT_COLUMNS for name in names):
+        raise InvalidFields(fields)
+    return names
+
+def select_fields(fields=EXPORT_COLUMNS):
+    # Plain column tuples: no ORM identity map, no per-object attribute instrumentation.
+    return select(*(getattr(models.Expense, f) for f in fields))
+
+def to_dicts(rows, fields=EXPORT_COLUMNS):
+    return [dict(zip(fields, row)) for row in rows]
+
+def encode_cursor(expense_date, expense_id):
+    raw = f"{expense_date.isoformat()}:{expense_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, expense_id = raw.split(":")
+        return date.fromisoformat(day), int(expense_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(cursor) from e
+
+def _date_filter(stmt, user_id, start=None, end=None):
+    stmt = stmt.where(models.Expense.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(models.Expense.date >= start)
+    if end is not None:
+        stmt = stmt.where(models.Expense.date <= end)
+    return stmt
+
+async def page(db: AsyncSession, user_id, limit, cursor=None, start=None, end=None, category=None,
+               fields=EXPORT_COLUMNS):
+    # date and id are always fetched (after the requested fields) to build the cursor.
+    selected = tuple(dict.fromkeys(fields + ("date", "id")))
+    stmt = _date_filter(select_fields(selected), user_id, start, end)
+    if category is not None:
+        stmt = stmt.where(models.Expense.category == category)
+    if cursor:
+        stmt = stmt.where(tuple_(models.Expense.date, models.Expense.id) < decode_cursor(cursor))
+    stmt = stmt.order_by(models.Expense.date.desc(), models.Expense.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return {"items": to_dicts(rows, fields), "next_cursor": next_cursor}
+
+def _csv_chunk(rows, header=False):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+    return buf.getvalue()
+
+def _ndjson_chunk(rows):
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + "\n" for row in rows
+    )
+
+async def stream_export(fmt, user_id, start=None, end=None):
+    columns = [getattr(models.Expense, c) for c in EXPORT_COLUMNS]
+    stmt = _date_filter(select(*columns), user_id, start, end).order_by(models.Expense.date, models.Expense.id)
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        if fmt == "csv":
+            yield _csv_chunk([], header=True)
+        async for rows in result.partitions():
+            yield _csv_chunk(rows) if fmt == "csv" else _ndjson_chunk(rows)
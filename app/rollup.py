@@ -0,0 +1,118 @@
+import asyncio
+import sys
+from collections import defaultdict
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, database, summary, versioning
+
+TOLERANCE = 0.005
+
+def month_key(d):
+    return d.strftime("%Y-%m")
+
+async def _upsert(db: AsyncSession, user_id, month, category, total, count):
+    stmt = database.upsert_insert(db, models.MonthlyTotal).values(
+        user_id=user_id, month=month, category=category, total=total, count=count,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.MonthlyTotal.user_id, models.MonthlyTotal.month, models.MonthlyTotal.category],
+        set_={
+            "total": models.MonthlyTotal.total + stmt.excluded.total,
+            "count": models.MonthlyTotal.count + stmt.excluded.count,
+        },
+    )
+    await db.execute(stmt)
+
+async def apply(db: AsyncSession, rows, sign=1):
+    deltas = defaultdict(lambda: [0.0, 0])
+    for r in rows:
+        key = (r.user_id, month_key(r.date), r.category or "")
+        deltas[key][0] += sign * r.amount
+        deltas[key][1] += sign
+    for (user_id, month, category), (total, count) in sorted(deltas.items()):
+        await _upsert(db, user_id, month, category, total, count)
+    if sign < 0:
+        await db.execute(delete(models.MonthlyTotal).where(
+            models.MonthlyTotal.user_id.in_({user_id for user_id, _, _ in deltas}),
+            models.MonthlyTotal.count <= 0,
+        ))
+
+async def category_totals(db: AsyncSession, user_id):
+    result = await db.execute(
+        select(models.MonthlyTotal.month, models.MonthlyTotal.category, models.MonthlyTotal.total)
+        .where(models.MonthlyTotal.user_id == user_id)
+        .order_by(models.MonthlyTotal.month)
+    )
+    return result.all()
+
+async def recompute(db: AsyncSession):
+    month = summary.month_expr(db).label("month")
+    category = func.coalesce(models.Expense.category, "").label("category")
+    result = await db.execute(
+        select(models.Expense.user_id, month, category, func.sum(models.Expense.amount), func.count(models.Expense.id))
+        .group_by(models.Expense.user_id, month, category)
+    )
+    return {(u, m, c): [float(t), n] for u, m, c, t, n in result.all()}
+
+async def rebuild(db: AsyncSession):
+    totals = await recompute(db)
+    # Cached forecasts and summaries are keyed by data version, so every user
+    # whose totals may change gets a new one.
+    users = set(await db.scalars(select(models.MonthlyTotal.user_id).distinct()))
+    await versioning.bump_many(db, users | {u for u, _, _ in totals})
+    await db.execute(delete(models.MonthlyTotal))
+    if totals:
+        await db.execute(insert(models.MonthlyTotal), [
+            {"user_id": u, "month": m, "category": c, "total": t, "count": n}
+            for (u, m, c), (t, n) in totals.items()
+        ])
+    await db.commit()
+    return len(totals)
+
+async def check(db: AsyncSession):
+    expected = await recompute(db)
+    actual = {
+        (r.user_id, r.month, r.category): [r.total, r.count]
+        for r in (await db.scalars(select(models.MonthlyTotal))).all()
+    }
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        exp_total, exp_count = expected.get(key, (0.0, 0))
+        act_total, act_count = actual.get(key, (0.0, 0))
+        if exp_count != act_count or abs(exp_total - act_total) > TOLERANCE:
+            mismatches.append({
+                "user_id": key[0],
+                "month": key[1],
+                "category": key[2],
+                "expected_total": round(exp_total, 2),
+                "actual_total": round(act_total, 2),
+                "expected_count": exp_count,
+                "actual_count": act_count,
+            })
+    return mismatches
+
+async def _run(command):
+    try:
+        async with database.async_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        async with database.AsyncSessionLocal() as db:
+            if command == "rebuild":
+                n = await rebuild(db)
+                print(f"Rebuilt monthly_totals: {n} rows")
+                return 0
+            mismatches = await check(db)
+            for m in mismatches:
+                print(m)
+            print(f"{len(mismatches)} mismatched rows")
+            return 1 if mismatches else 0
+    finally:
+        await database.async_engine.dispose()
+
+def main(argv):
+    if len(argv) != 1 or argv[0] not in ("rebuild", "check"):
+        print("usage: python -m app.rollup [rebuild|check]")
+        return 2
+    return asyncio.run(_run(argv[0]))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
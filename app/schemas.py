@@ -1,5 +1,7 @@
+import datetime as dt
 from pydantic import BaseModel
-from datetime import date
+from datetime import date, datetime
+from typing import Any, Optional
 
 class ExpenseBase(BaseModel):
     title: str
@@ -15,3 +17,122 @@ class Expense(ExpenseBase):
 
     class Config:
         orm_mode = True
+
+class ExpenseSelector(BaseModel):
+    ids: Optional[list[int]] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+    category: Optional[str] = None
+
+class ExpenseFields(BaseModel):
+    title: Optional[str] = None
+    amount: Optional[float] = None
+    category: Optional[str] = None
+    date: Optional[dt.date] = None
+
+class ExpensePatch(ExpenseSelector):
+    set: ExpenseFields
+
+class ExpensePage(BaseModel):
+    items: list[Expense]
+    next_cursor: Optional[str] = None
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkResult(BaseModel):
+    inserted: int
+    errors: list[BulkRowError]
+
+class CategorizeRequest(BaseModel):
+    title: Optional[str] = None
+    titles: list[str] = []
+    k: int = 3
+
+class CategoryScore(BaseModel):
+    category: str
+    probability: float
+
+class CategoryPrediction(BaseModel):
+    title: str
+    category: str
+    candidates: list[CategoryScore]
+
+class CategorizeResponse(BaseModel):
+    results: list[CategoryPrediction]
+
+class BudgetIn(BaseModel):
+    amount: float
+    category: str = ""
+
+class Budget(BudgetIn):
+    month: str
+
+    class Config:
+        orm_mode = True
+
+class BudgetStatus(BaseModel):
+    month: str
+    category: str
+    budget: Optional[float]
+    budget_month: Optional[str]
+    current_total: float
+    amount: float
+    projected_total: float
+    remaining: Optional[float]
+    exceeded: bool
+
+class Change(BaseModel):
+    seq: int
+    op: str
+    id: int
+    before: Optional[dict]
+    after: Optional[dict]
+
+class ChangeFeed(BaseModel):
+    changes: list[Change]
+    next: int
+    more: bool
+
+class Flag(BaseModel):
+    id: int
+    kind: str
+    score: Optional[float]
+    related_id: Optional[int]
+    title: str
+    amount: float
+    category: str
+    date: date
+
+class Credentials(BaseModel):
+    username: str
+    password: str
+
+class User(BaseModel):
+    id: int
+    username: str
+
+    class Config:
+        orm_mode = True
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_at: int
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress: int
+    total: Optional[int]
+    message: Optional[str]
+    result: Optional[Any]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, database
+
+def month_expr(db: AsyncSession):
+    if database.dialect_name(db) == "postgresql":
+        return func.to_char(models.Expense.date, "YYYY-MM")
+    return func.strftime("%Y-%m", models.Expense.date)
+
+def _filtered(stmt, user_id, start=None, end=None):
+    stmt = stmt.where(models.Expense.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(models.Expense.date >= start)
+    if end is not None:
+        stmt = stmt.where(models.Expense.date <= end)
+    return stmt
+
+async def date_range(db: AsyncSession, user_id, start=None, end=None):
+    result = await db.execute(_filtered(
+        select(
+            func.coalesce(func.sum(models.Expense.amount), 0.0),
+            func.count(),
+            func.min(models.Expense.date),
+            func.max(models.Expense.date),
+        ),
+        user_id, start, end,
+    ))
+    total, count, first, last = result.one()
+    return {"start": first, "end": last, "total": round(float(total), 2), "count": count}
+
+async def by_month(db: AsyncSession, user_id, start=None, end=None):
+    month = month_expr(db).label("month")
+    result = await db.execute(_filtered(
+        select(month, func.sum(models.Expense.amount), func.count()),
+        user_id, start, end,
+    ).group_by(month).order_by(month))
+    return [{"month": m, "total": round(float(t), 2), "count": n} for m, t, n in result.all()]
+
+async def by_category(db: AsyncSession, user_id, start=None, end=None):
+    result = await db.execute(_filtered(
+        select(models.Expense.category, func.sum(models.Expense.amount), func.count()),
+        user_id, start, end,
+    ).group_by(models.Expense.category).order_by(func.sum(models.Expense.amount).desc()))
+    return [{"category": c, "total": round(float(t), 2), "count": n} for c, t, n in result.all()]
+
+async def _daily(db: AsyncSession, user_id, start=None, end=None):
+    result = await db.execute(_filtered(
+        select(models.Expense.date, func.sum(models.Expense.amount), func.count()),
+        user_id, start, end,
+    ).group_by(models.Expense.date).order_by(models.Expense.date))
+    return result.all()
+
+def _days(daily):
+    days = []
+    cumulative = 0.0
+    for d, t, n in daily:
+        cumulative += t
+        days.append({"date": d, "total": round(float(t), 2), "count": n, "cumulative": round(cumulative, 2)})
+    return days
+
+async def by_day(db: AsyncSession, user_id, start=None, end=None):
+    return _days(await _daily(db, user_id, start, end))
+
+def fold_weeks(daily):
+    # Folds the unrounded daily sums and rounds once per week, so a week's
+    # total matches a direct SUM rather than drifting by the days' rounding.
+    weeks = OrderedDict()
+    for d, t, n in daily:
+        year, week, _ = d.isocalendar()
+        key = f"{year}-W{week:02d}"
+        bucket = weeks.setdefault(key, {"week": key, "total": 0.0, "count": 0})
+        bucket["total"] += float(t)
+        bucket["count"] += n
+    for bucket in weeks.values():
+        bucket["total"] = round(bucket["total"], 2)
+    return list(weeks.values())
+
+async def by_week(db: AsyncSession, user_id, start=None, end=None):
+    return fold_weeks(await _daily(db, user_id, start, end))
+
+async def overview(db: AsyncSession, user_id, start=None, end=None):
+    daily = await _daily(db, user_id, start, end)
+    return {
+        "range": await date_range(db, user_id, start, end),
+        "monthly": await by_month(db, user_id, start, end),
+        "weekly": fold_weeks(daily),
+        "category": await by_category(db, user_id, start, end),
+        "daily": _days(daily),
+    }
@@ -0,0 +1,131 @@
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+import joblib
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sqlalchemy import and_, func, or_, select
+from app import config, database, models, model_store
+
+SAMPLES_PATH = Path(__file__).resolve().parent.parent / "expense_samples.csv"
+CHUNK_SIZE = 5000
+N_FEATURES = 2 ** 18
+
+def make_vectorizer():
+    return HashingVectorizer(n_features=N_FEATURES, alternate_sign=False, norm="l2")
+
+def _labelled(stmt):
+    return stmt.where(models.Expense.category.isnot(None), models.Expense.category != "")
+
+def _trainable_changes(after_seq, through_seq):
+    # Expenses added, or whose title or category changed, between two points
+    # in the change feed. The feed keeps each row's state before and after.
+    change = models.ExpenseChange
+    edited = or_(*(change.before[c].as_string().is_distinct_from(change.after[c].as_string())
+                   for c in ("title", "category")))
+    return (
+        select(change.expense_id)
+        .where(change.seq > after_seq, change.seq <= through_seq,
+               or_(change.op == "insert", and_(change.op == "update", edited)))
+    )
+
+def stream_labelled(engine, chunk_size=CHUNK_SIZE, after_seq=None, through_seq=None):
+    stmt = select(models.Expense.id, models.Expense.title, models.Expense.category)
+    if after_seq is not None:
+        stmt = stmt.where(models.Expense.id.in_(_trainable_changes(after_seq, through_seq)))
+    stmt = _labelled(stmt).order_by(models.Expense.id)
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(stmt)
+        for rows in result.partitions():
+            yield rows
+
+def settled_change(engine, settle_seconds=None):
+    # Seqs are handed out at insert, not at commit, so the newest changes may
+    # sit above a smaller seq whose transaction hasn't committed yet. A run
+    # only goes as far as changes older than the settle time; anything newer
+    # is left for the next run, which picks up from here.
+    settle_seconds = config.TRAINING_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    with engine.connect() as conn:
+        return conn.scalar(select(func.coalesce(func.max(models.ExpenseChange.seq), 0))
+                           .where(models.ExpenseChange.changed_at <= cutoff))
+
+def _feed_covers(engine, seq):
+    # Pruned changes can't be replayed; a model that old needs a full retrain.
+    with engine.connect() as conn:
+        oldest = conn.scalar(select(func.min(models.ExpenseChange.seq)))
+    return oldest is None or seq >= oldest - 1
+
+def database_classes(engine):
+    with engine.connect() as conn:
+        return {c for (c,) in conn.execute(_labelled(select(models.Expense.category).distinct()))}
+
+def _load_incremental(engine):
+    manifest = model_store.read_manifest()
+    if not manifest or manifest.get("kind") != "sgd":
+        return None, None
+    after_seq = manifest.get("trained_through_seq")
+    # Models published before the change feed drove training have no cursor in it.
+    if after_seq is None or not _feed_covers(engine, after_seq):
+        return None, None
+    clf = joblib.load(model_store.state_path(manifest)).named_steps["clf"]
+    # A category the model has never seen can't be added with partial_fit.
+    if not database_classes(engine) <= set(clf.classes_):
+        return None, None
+    return clf, after_seq
+
+def train(engine, full=False, chunk_size=CHUNK_SIZE, samples_path=SAMPLES_PATH, format="npy", progress=None):
+    vectorizer = make_vectorizer()
+    through_seq = settled_change(engine)
+    clf, after_seq = (None, None) if full else _load_incremental(engine)
+    mode = "incremental" if clf is not None else "full"
+    if clf is None:
+        samples = pd.read_csv(samples_path)
+        classes = sorted(database_classes(engine) | set(samples["category"]))
+        clf = SGDClassifier(loss="log_loss", alpha=1e-5, random_state=0)
+        clf.partial_fit(vectorizer.transform(samples["title"]), samples["category"], classes=classes)
+
+    seen = 0
+    for rows in stream_labelled(engine, chunk_size, after_seq, through_seq):
+        _, titles, labels = zip(*rows)
+        clf.partial_fit(vectorizer.transform(titles), labels)
+        seen += len(rows)
+        if progress is not None:
+            progress(seen)
+
+    if mode == "incremental" and seen == 0:
+        return None
+
+    return model_store.publish(
+        Pipeline([("hash", vectorizer), ("clf", clf)]),
+        format=format,
+        kind="sgd",
+        mode=mode,
+        trained_through_seq=through_seq,
+        rows=seen,
+        classes=[str(c) for c in clf.classes_],
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or incrementally update the category classifier")
+    parser.add_argument("--full", action="store_true", help="retrain from scratch instead of partial_fit on new rows")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--format", choices=("npy", "joblib"), default="npy",
+                        help="npy publishes memory-mappable arrays; joblib a single pickle")
+    args = parser.parse_args()
+
+    engine = database.make_engine()
+    try:
+        manifest = train(engine, full=args.full, chunk_size=args.chunk_size, format=args.format)
+    finally:
+        engine.dispose()
+    if manifest is None:
+        print("No new labelled expenses; model unchanged")
+    else:
+        print(f"Published model v{manifest['version']} ({manifest['mode']}, {manifest['rows']} rows, "
+              f"through change {manifest['trained_through_seq']})")
+
+if __name__ == "__main__":
+    main()
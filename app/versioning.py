@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, database
+
+async def bump(db: AsyncSession, user_id):
+    now = datetime.utcnow()
+    stmt = database.upsert_insert(db, models.DataVersion).values(user_id=user_id, version=1, updated_at=now)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.DataVersion.user_id],
+        set_={"version": models.DataVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+    ))
+
+async def bump_many(db: AsyncSession, user_ids):
+    if not user_ids:
+        return
+    now = datetime.utcnow()
+    stmt = database.upsert_insert(db, models.DataVersion)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.DataVersion.user_id],
+        set_={"version": models.DataVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+    ), [{"user_id": user_id, "version": 1, "updated_at": now} for user_id in sorted(user_ids)])
+
+async def current(db: AsyncSession, user_id):
+    row = (await db.execute(
+        select(models.DataVersion.version, models.DataVersion.updated_at).where(models.DataVersion.user_id == user_id)
+    )).first()
+    return (row.version, row.updated_at) if row else (0, None)
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import analytics, anomalies, database, models
+from benchmarks import explain, seed
+
+async def measure(url, duplicates):
+    engine = database.make_async_engine(url)
+    try:
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            if duplicates:
+                # Copies of existing rows (a day later on Postgres) give the scan something to find.
+                day = models.Expense.date + 1 if engine.dialect.name == "postgresql" else models.Expense.date
+                await db.execute(models.Expense.__table__.insert().from_select(
+                    ["user_id", "title", "amount", "category", "date"],
+                    select(models.Expense.user_id, models.Expense.title, models.Expense.amount,
+                           models.Expense.category, day).order_by(models.Expense.id).limit(duplicates),
+                ))
+                await db.commit()
+            timings = {}
+            started = time.perf_counter()
+            stmt = select(*anomalies.COLUMNS)
+            table = await analytics.query_table(db, stmt, anomalies._frame_schema())
+            timings["fetch_s"] = time.perf_counter() - started
+            started = time.perf_counter()
+            frame = anomalies.frame_from_table(table)
+            timings["frame_s"] = time.perf_counter() - started
+            started = time.perf_counter()
+            flags = anomalies.detect(frame)
+            timings["detect_s"] = time.perf_counter() - started
+            started = time.perf_counter()
+            result = await anomalies.backfill(db)
+            timings["backfill_s"] = time.perf_counter() - started
+    finally:
+        await engine.dispose()
+    return {"rows": table.num_rows, **{k: round(v, 3) for k, v in timings.items()},
+            "flags": len(flags), **{k: v for k, v in result.items() if k != "rows"}}
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the duplicate and outlier backfill on a seeded table")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), required=os.getenv("DATABASE_URL") is None,
+                        help="database URL (tables are dropped and reseeded unless they already hold --rows rows)")
+    parser.add_argument("--rows", default="1m", help="row count to seed")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--duplicates", type=int, default=1000, help="copies of existing rows to insert first")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    rows = seed.parse_size(args.rows)
+    if asyncio.run(explain.count_expenses(args.url)) < rows:
+        print(f"Seeding {rows:,} rows...")
+        seed.seed(args.url, rows, users=args.users)
+    result = asyncio.run(measure(args.url, args.duplicates))
+    for key, value in result.items():
+        print(f"{key:<14}{value}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
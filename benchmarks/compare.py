@@ -0,0 +1,45 @@
+import argparse
+import json
+import sys
+
+GUARDED_ROUTES = ("list", "page", "summary", "forecast")
+
+def _index(report):
+    return {
+        (size["rows"], route["route"]): route
+        for size in report["sizes"]
+        for route in size["routes"]
+    }
+
+def compare(baseline, current, max_regression=0.2, routes=GUARDED_ROUTES):
+    old = _index(baseline)
+    regressions = []
+    for key, new in _index(current).items():
+        if key[1] not in routes or key not in old:
+            continue
+        before = old[key]
+        if new["p99_ms"] > before["p99_ms"] * (1 + max_regression):
+            regressions.append(f"{key[1]} @ {key[0]} rows: p99 {before['p99_ms']} -> {new['p99_ms']} ms")
+        if new["rps"] < before["rps"] * (1 - max_regression):
+            regressions.append(f"{key[1]} @ {key[0]} rows: rps {before['rps']} -> {new['rps']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a benchmark report regressed against a baseline")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--routes", default=",".join(GUARDED_ROUTES))
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.max_regression, args.routes.split(","))
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    print(f"{len(regressions)} regressions")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
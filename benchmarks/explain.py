@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import os
+import re
+import sys
+from datetime import date, timedelta
+from sqlalchemy import event, func, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import database, models, pagination, rollup, summary
+from benchmarks import seed
+
+SEQ_SCAN = {
+    "postgresql": re.compile(r"Seq Scan on expenses(_p\d+)?\b"),
+    "sqlite": re.compile(r"\bSCAN expenses\b(?! USING)"),
+}
+
+def hot_queries(today, user_id):
+    """The calls the API makes for the list, range-filter, summary and forecast routes, by name."""
+    async def list_next_page(db):
+        first = await pagination.page(db, user_id, 100)
+        return await pagination.page(db, user_id, 100, first["next_cursor"])
+
+    return {
+        "list: first page": lambda db: pagination.page(db, user_id, 100),
+        "list: next page": list_next_page,
+        "list: one category": lambda db: pagination.page(db, user_id, 100, category="Food"),
+        "range: last 30 days": lambda db: pagination.page(db, user_id, 100, start=today - timedelta(days=30), end=today),
+        "summary: range totals": lambda db: summary.date_range(db, user_id, today - timedelta(days=30), today),
+        "summary: by category": lambda db: summary.by_category(db, user_id, today - timedelta(days=90), today),
+        "summary: by month": lambda db: summary.by_month(db, user_id, today - timedelta(days=365), today),
+        "summary: by day": lambda db: summary.by_day(db, user_id, today - timedelta(days=30), today),
+        "forecast: rollup": lambda db: rollup.category_totals(db, user_id),
+    }
+
+async def capture_statements(engine, db, run):
+    """Run `run(db)` and return the (statement, parameters) pairs it sent to the database."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        await run(db)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    return statements
+
+async def query_plan(db, dialect, statement, parameters, analyze):
+    """Return the plan for one captured statement as a list of lines."""
+    conn = await db.connection()
+    if dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN "
+        return [r[0] for r in (await conn.exec_driver_sql(prefix + statement, parameters)).all()]
+    return [r[-1] for r in (await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)).all()]
+
+async def prepare(engine, dialect):
+    """Refresh statistics, and on Postgres the visibility map so index-only scans are possible."""
+    if dialect == "postgresql":
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("VACUUM ANALYZE expenses")
+            await conn.exec_driver_sql("VACUUM ANALYZE monthly_totals")
+    else:
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("ANALYZE")
+
+async def explain(url, analyze=False, user_id=1):
+    engine = database.make_async_engine(url)
+    dialect = engine.dialect.name
+    failures = []
+    try:
+        await prepare(engine, dialect)
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            rows = await db.scalar(select(func.count()).select_from(models.Expense))
+            newest = await db.scalar(select(func.max(models.Expense.date))) or date.today()
+            print(f"{dialect}: {rows:,} expenses, plans for user {user_id}\n")
+            for name, run in hot_queries(newest, user_id).items():
+                statement, parameters = (await capture_statements(engine, db, run))[-1]
+                plan = await query_plan(db, dialect, statement, parameters, analyze)
+                seq_scan = any(SEQ_SCAN[dialect].search(line) for line in plan)
+                if seq_scan:
+                    failures.append(name)
+                print(f"== {name}{'  [SEQUENTIAL SCAN]' if seq_scan else ''}")
+                print("\n".join(f"   {line}" for line in plan) + "\n")
+    finally:
+        await engine.dispose()
+    return failures
+
+async def count_expenses(url):
+    """Rows in expenses, or 0 when the table doesn't exist yet."""
+    engine = database.make_async_engine(url)
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(text("SELECT count(*) FROM expenses"))).scalar()
+    except Exception:
+        return 0
+    finally:
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Print query plans for the API's hot queries on a seeded table")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), required=os.getenv("DATABASE_URL") is None,
+                        help="database URL (tables are dropped and reseeded unless they already hold --rows rows)")
+    parser.add_argument("--rows", default="1m", help="row count to seed, e.g. 100k, 1m")
+    parser.add_argument("--users", default="1", help="users to spread seeded rows over")
+    parser.add_argument("--user", type=int, default=1, help="user whose queries are explained")
+    parser.add_argument("--analyze", action="store_true", help="run EXPLAIN ANALYZE on Postgres")
+    args = parser.parse_args()
+
+    rows = seed.parse_size(args.rows)
+    if asyncio.run(count_expenses(args.url)) < rows:
+        print(f"Seeding {rows:,} rows...")
+        seed.seed(args.url, rows, users=seed.parse_size(args.users))
+    failures = asyncio.run(explain(args.url, args.analyze, args.user))
+    if failures:
+        print(f"Sequential scans on expenses: {', '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
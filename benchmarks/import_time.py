@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from benchmarks import run
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("app.main", "streamlit", "pandas", "plotly.express", "sklearn", "numpy", "requests")
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def import_time(module, repeat=3):
+    # Cumulative microseconds reported by -X importtime for the top-level module, best of N runs.
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONWARNINGS": "ignore"},
+        )
+        if proc.returncode != 0:
+            return None
+        total = 0
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match and len(match.group(3)) == 1:
+                total += int(match.group(2))
+        best = total if best is None else min(best, total)
+    return round(best / 1000, 1)
+
+def time_to_ready(database_url, port):
+    started = time.perf_counter()
+    process, _ = run.start_server(database_url, port)
+    elapsed = time.perf_counter() - started
+    run.stop_server(process)
+    return round(elapsed * 1000, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and API cold-start time against a budget")
+    parser.add_argument("--modules", default=",".join(MODULES))
+    parser.add_argument("--url", help="database URL for the time-to-ready check (default: temporary SQLite)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="maximum import time for app.main")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = {"imports_ms": {}}
+    for module in args.modules.split(","):
+        results["imports_ms"][module] = import_time(module)
+        print(f"{module:<16} {results['imports_ms'][module]} ms")
+
+    database_url = args.url or f"sqlite:///{ROOT / 'benchmarks' / 'results' / 'cold_start.db'}"
+    (ROOT / "benchmarks" / "results").mkdir(exist_ok=True)
+    results["api_ready_ms"] = time_to_ready(database_url, args.port)
+    print(f"{'api ready':<16} {results['api_ready_ms']} ms")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    app_import = results["imports_ms"].get("app.main")
+    if app_import is not None and app_import > args.budget_ms:
+        print(f"app.main import took {app_import} ms, over the {args.budget_ms} ms budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+import httpx
+from app import auth
+from benchmarks import seed
+
+DEFAULT_ROUTES = ("list", "summary", "forecast", "create")
+
+class Context:
+    def __init__(self, max_id=0, users=1, seed=7):
+        self.rng = random.Random(seed)
+        self.max_id = max_id
+        self.users = users
+        self._deletable = None
+        self._titles = None
+        # Minted locally rather than logged in, so thousands of users don't each
+        # cost a password hash on the server. Needs the server's SECRET_KEY.
+        self._tokens = {}
+
+    def headers(self, user_id=None):
+        user_id = user_id or self.rng.randint(1, self.users)
+        if user_id not in self._tokens:
+            self._tokens[user_id] = auth.issue_token(user_id)[0]
+        return {"Authorization": f"Bearer {self._tokens[user_id]}"}
+
+    def owner_headers(self, expense_id):
+        # Seeded expenses are dealt out to users round-robin (see seed.owner).
+        return self.headers((expense_id - 1) % self.users + 1)
+
+    def random_title(self):
+        # Sample titles with a suffix and a store number: a long tail of
+        # distinct titles, so the classifier cache doesn't hold them all.
+        if self._titles is None:
+            self._titles = [title for title, _ in seed.load_samples()]
+        return f"{self.rng.choice(self._titles)}{self.rng.choice(seed.SUFFIXES)} #{self.rng.randint(1, 500)}"
+
+    def random_id(self):
+        return self.rng.randint(1, max(1, self.max_id))
+
+    def next_delete_id(self):
+        if self._deletable is None:
+            ids = list(range(1, self.max_id + 1))
+            self.rng.shuffle(ids)
+            self._deletable = iter(ids)
+        return next(self._deletable, self.random_id())
+
+def _expense_payload():
+    day = date.today() - timedelta(days=random.randint(0, 365))
+    return {"title": "load test", "amount": round(random.uniform(1, 500), 2), "category": "Food", "date": str(day)}
+
+def _update(c, ctx):
+    expense_id = ctx.random_id()
+    return c.put(f"/expenses/{expense_id}", json=_expense_payload(), headers=ctx.owner_headers(expense_id))
+
+def _delete(c, ctx):
+    expense_id = ctx.next_delete_id()
+    return c.delete(f"/expenses/{expense_id}", headers=ctx.owner_headers(expense_id))
+
+ROUTES = {
+    "list": lambda c, ctx: c.get("/expenses/", params={"limit": 100}, headers=ctx.headers()),
+    "page": lambda c, ctx: c.get("/expenses/page", params={"limit": 100}, headers=ctx.headers()),
+    "summary": lambda c, ctx: c.get("/expenses/summary", headers=ctx.headers()),
+    "forecast": lambda c, ctx: c.get("/expenses/forecast", headers=ctx.headers()),
+    "create": lambda c, ctx: c.post("/expenses/", json=_expense_payload(), headers=ctx.headers()),
+    "categorize": lambda c, ctx: c.post("/categorize", json={"title": ctx.random_title()}, headers=ctx.headers()),
+    "update": _update,
+    "delete": _delete,
+}
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+async def run_route(client, name, requests, concurrency, ctx):
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await ROUTES[name](client, ctx)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "route": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+    }
+
+async def run(base_url, routes, requests, concurrency, warmup=20, max_id=0, users=1, transport=None):
+    ctx = Context(max_id, users)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60, transport=transport) as client:
+        results = []
+        for name in routes:
+            await run_route(client, name, warmup, min(concurrency, warmup), ctx)
+            results.append(await run_route(client, name, requests, concurrency, ctx))
+        return results
+
+def print_table(results):
+    print(f"{'route':<10} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for r in results:
+        print(f"{r['route']:<10} {r['rps']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['errors']:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test against a running expense API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--routes", default=",".join(DEFAULT_ROUTES))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--max-id", type=int, default=0, help="highest seeded expense id, used by update/delete")
+    parser.add_argument("--users", type=int, default=1, help="seeded users to spread requests over")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.url, args.routes.split(","), args.requests, args.concurrency,
+                              max_id=args.max_id, users=args.users))
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
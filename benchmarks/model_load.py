@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in a fresh interpreter per artifact so import cost and RSS aren't shared between the two.
+PROBE = r"""
+import json, sys, time
+import numpy as np
+
+def status():
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0]) / 1024
+    return fields
+
+from app import classifier
+
+path, titles, batch = sys.argv[1], json.loads(sys.argv[2]), int(sys.argv[3])
+before = status()
+started = time.perf_counter()
+model = classifier.CategoryClassifier.load(path).model
+loaded = time.perf_counter() - started
+after = status()
+
+model.predict_proba(titles[:1])
+timings = []
+for title in titles:
+    t = time.perf_counter()
+    model.predict_proba([title])
+    timings.append((time.perf_counter() - t) * 1e6)
+t = time.perf_counter()
+model.predict_proba((titles * (batch // len(titles) + 1))[:batch])
+batch_us = (time.perf_counter() - t) * 1e6 / batch
+
+print(json.dumps({
+    "load_ms": round(loaded * 1000, 1),
+    "rss_mb": round(after.get("VmRSS", 0) - before.get("VmRSS", 0), 1),
+    "private_mb": round(after.get("RssAnon", 0) - before.get("RssAnon", 0), 1),
+    "sklearn_imported": "sklearn" in sys.modules,
+    "p50_us": round(float(np.percentile(timings, 50)), 1),
+    "p95_us": round(float(np.percentile(timings, 95)), 1),
+    "batch_us_per_title": round(batch_us, 1),
+}))
+"""
+
+def probe(path, titles, batch):
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE, str(path), json.dumps(titles), str(batch)],
+        cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONWARNINGS": "ignore"},
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def sample_titles(limit):
+    import csv
+    with open(ROOT / "expense_samples.csv", newline="") as f:
+        titles = [row["title"] for row in csv.DictReader(f)]
+    return (titles * (limit // len(titles) + 1))[:limit]
+
+def print_table(results):
+    columns = ("load_ms", "rss_mb", "private_mb", "p50_us", "p95_us", "batch_us_per_title", "sklearn_imported")
+    print(f"{'artifact':<10}" + "".join(f"{c:>20}" for c in columns))
+    for name, row in results.items():
+        print(f"{name:<10}" + "".join(f"{str(row[c]):>20}" for c in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the pickled classifier with its memory-mapped npy export")
+    parser.add_argument("--pickle", default=str(ROOT / "category_classifier.pkl"))
+    parser.add_argument("--npy", help="existing npy export (default: export --pickle to a temporary directory)")
+    parser.add_argument("--titles", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    titles = sample_titles(args.titles)
+    with tempfile.TemporaryDirectory() as tmp:
+        npy = args.npy
+        if npy is None:
+            npy = Path(tmp) / "model"
+            subprocess.run([sys.executable, "-m", "app.compact_model", args.pickle, "--out", str(npy)],
+                           cwd=ROOT, check=True, capture_output=True,
+                           env={**os.environ, "PYTHONWARNINGS": "ignore"})
+        results = {
+            "pickle": probe(args.pickle, titles, args.batch),
+            "npy": probe(npy, titles, args.batch),
+        }
+    print_table(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from benchmarks import compare, load_test, seed
+
+ROOT = Path(__file__).resolve().parent.parent
+ALL_ROUTES = ("create", "list", "page", "summary", "forecast", "update", "delete")
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _wait_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            if httpx.get(f"{url}/metrics", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("API server did not become ready")
+
+def start_server(database_url, port, workers=1):
+    env = {**os.environ, "DATABASE_URL": database_url}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(url, process)
+    except Exception:
+        process.terminate()
+        raise
+    return process, url
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def run_size(database_url, rows, routes, requests, concurrency, port, users=1):
+    seeded = seed.seed(database_url, rows, users=users)
+    process, url = start_server(database_url, port)
+    try:
+        results = asyncio.run(load_test.run(url, routes, requests, concurrency, max_id=rows, users=users))
+    finally:
+        stop_server(process)
+    return {"rows": rows, "seed": seeded, "routes": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed, load-test and report on every API route")
+    parser.add_argument("--url", help="database URL (default: a temporary SQLite file)")
+    parser.add_argument("--sizes", default="10k", help="comma separated row counts, e.g. 10k,1m,10m")
+    parser.add_argument("--routes", default=",".join(ALL_ROUTES))
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", default="1", help="users to spread seeded rows and requests over")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default=None, help="report path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="previous report to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    database_url = args.url or f"sqlite:///{Path(tmpdir.name) / 'bench.db'}"
+    routes = args.routes.split(",")
+    started = datetime.now(timezone.utc)
+    report = {
+        "generated_at": started.isoformat(),
+        "commit": _git_commit(),
+        "database": database_url.split(":", 1)[0],
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "users": seed.parse_size(args.users),
+        "sizes": [],
+    }
+    try:
+        for size in args.sizes.split(","):
+            rows = seed.parse_size(size)
+            print(f"== {rows} rows")
+            result = run_size(database_url, rows, routes, args.requests, args.concurrency, args.port,
+                              report["users"])
+            load_test.print_table(result["routes"])
+            report["sizes"].append(result)
+    finally:
+        tmpdir.cleanup()
+
+    output = Path(args.output or ROOT / "benchmarks" / "results" / f"{started:%Y%m%dT%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Report written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare.compare(json.load(f), report, args.max_regression)
+        for r in regressions:
+            print(f"REGRESSION {r}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
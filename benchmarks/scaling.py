@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import httpx
+from benchmarks import explain, load_test, run, seed
+
+DEFAULT_ROUTES = ("summary", "forecast", "list", "categorize")
+
+def start_gunicorn(database_url, port, workers, cache_backend):
+    env = {
+        **os.environ, "DATABASE_URL": database_url, "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{port}", "CACHE_BACKEND": cache_backend, "JOB_WORKERS": "0",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+        cwd=run.ROOT, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        run._wait_ready(url, process)
+    except Exception:
+        process.terminate()
+        raise
+    return process, url
+
+def _children(pid):
+    children = []
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                # The parent pid is the second field after the parenthesised command.
+                if int((entry / "stat").read_text().rsplit(")", 1)[1].split()[1]) == pid:
+                    children.append(int(entry.name))
+            except (OSError, IndexError, ValueError):
+                continue
+    return children
+
+def memory_mb(pid):
+    # PSS charges each page shared between the master and its forked workers
+    # once in total, so the sum is the real footprint. Falls back to RSS.
+    total_kb = 0
+    for process in [pid] + _children(pid):
+        try:
+            text = Path(f"/proc/{process}/smaps_rollup").read_text()
+            total_kb += int(re.search(r"^Pss:\s+(\d+)", text, re.M).group(1))
+        except (OSError, AttributeError):
+            try:
+                text = Path(f"/proc/{process}/status").read_text()
+                total_kb += int(re.search(r"^VmRSS:\s+(\d+)", text, re.M).group(1))
+            except (OSError, AttributeError):
+                continue
+    return round(total_kb / 1024, 1)
+
+def cache_hit_rate(url):
+    text = httpx.get(f"{url}/metrics", timeout=10).text
+    counts = {
+        m.group(1): float(m.group(2))
+        for m in re.finditer(r'^response_cache_requests_total\{result="(\w+)"\} (\S+)', text, re.M)
+    }
+    lookups = counts.get("hit", 0.0) + counts.get("miss", 0.0)
+    return round(counts.get("hit", 0.0) / lookups, 3) if lookups else None
+
+def _client(url, routes, requests, concurrency, users, client_id):
+    ctx = load_test.Context(users=users, seed=client_id)
+
+    async def drive():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            results = []
+            for name in routes:
+                await load_test.run_route(client, name, 20, min(concurrency, 20), ctx)
+                results.append(await load_test.run_route(client, name, requests, concurrency, ctx))
+            return results
+
+    return asyncio.run(drive())
+
+def drive(url, routes, requests, concurrency, users, clients):
+    # Several client processes, so one Python event loop doesn't cap what the
+    # workers can show. Throughput adds up; latency is the worst client's.
+    with ProcessPoolExecutor(clients) as pool:
+        per_client = list(pool.map(
+            _client, *zip(*[(url, routes, requests // clients, max(1, concurrency // clients), users, i + 1)
+                            for i in range(clients)])
+        ))
+    merged = []
+    for results in zip(*per_client):
+        merged.append({
+            "route": results[0]["route"],
+            "requests": sum(r["requests"] for r in results),
+            "errors": sum(r["errors"] for r in results),
+            "rps": round(sum(r["rps"] for r in results), 1),
+            "p50_ms": max(r["p50_ms"] for r in results),
+            "p99_ms": max(r["p99_ms"] for r in results),
+        })
+    return merged
+
+def measure(database_url, workers, cache_backend, routes, requests, concurrency, users, clients, port):
+    process, url = start_gunicorn(database_url, port, workers, cache_backend)
+    try:
+        results = drive(url, routes, requests, concurrency, users, clients)
+        return {
+            "workers": workers,
+            "cache": cache_backend,
+            "memory_mb": memory_mb(process.pid),
+            "cache_hit_rate": cache_hit_rate(url),
+            "routes": results,
+        }
+    finally:
+        run.stop_server(process)
+
+def print_table(reports, routes):
+    print(f"{'workers':>7} {'cache':<7} " + " ".join(f"{r + ' rps':>15}" for r in routes)
+          + f" {'p99 ms':>9} {'hit rate':>9} {'PSS MB':>8}")
+    for report in reports:
+        by_route = {r["route"]: r for r in report["routes"]}
+        p99 = max(r["p99_ms"] for r in report["routes"])
+        print(f"{report['workers']:>7} {report['cache']:<7} "
+              + " ".join(f"{by_route[r]['rps']:>15}" for r in routes)
+              + f" {p99:>9} {report['cache_hit_rate'] or 0:>9} {report['memory_mb']:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and memory of the API across gunicorn worker counts")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), required=os.getenv("DATABASE_URL") is None,
+                        help="database URL (seeded with --rows rows unless it already holds that many)")
+    parser.add_argument("--rows", default="100k")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    parser.add_argument("--cache", default="memory,shared", help="cache backends to compare")
+    parser.add_argument("--routes", default=",".join(DEFAULT_ROUTES))
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    rows = seed.parse_size(args.rows)
+    if asyncio.run(explain.count_expenses(args.url)) < rows:
+        print(f"Seeding {rows:,} rows...")
+        seed.seed(args.url, rows, users=args.users)
+    routes = args.routes.split(",")
+    reports = []
+    for cache_backend in args.cache.split(","):
+        for workers in (int(w) for w in args.workers.split(",")):
+            reports.append(measure(args.url, workers, cache_backend, routes, args.requests, args.concurrency,
+                                   args.users, args.clients, args.port))
+            print_table(reports[-1:], routes)
+    print()
+    print_table(reports, routes)
+    if args.output:
+        Path(args.output).write_text(json.dumps({"cpus": os.cpu_count(), "reports": reports}, indent=2))
+
+if __name__ == "__main__":
+    main()
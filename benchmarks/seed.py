@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import csv
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import auth, database, models, rollup
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLES_PATH = ROOT / "expense_samples.csv"
+CHUNK_SIZE = 100_000
+PASSWORD = "benchmark-password"
+
+AMOUNT_RANGES = {
+    "Food": (80, 1500),
+    "Travel": (50, 5000),
+    "Fuel": (300, 4000),
+    "Health": (100, 6000),
+    "Shopping": (200, 8000),
+    "Utilities": (150, 3000),
+    "Entertainment": (100, 2000),
+}
+SUFFIXES = ("", "", "", " - online", " (weekend)", " refund", " monthly", " x2")
+
+def parse_size(value):
+    value = value.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(value[-1])
+    return int(float(value[:-1]) * scale) if scale else int(value)
+
+def load_samples(path=SAMPLES_PATH):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["title"], row["category"]) for row in csv.DictReader(f)]
+
+def username(user_id):
+    return f"user{user_id}"
+
+def owner(expense_id, users):
+    # Expenses are dealt out round-robin, so the owner of a seeded id is known without a query.
+    return (expense_id - 1) % users + 1
+
+def generate(rows, years=3, seed=42, samples=None, users=1):
+    rng = random.Random(seed)
+    samples = samples or load_samples()
+    start = date.today() - timedelta(days=365 * years)
+    span = 365 * years
+    for i in range(rows):
+        title, category = rng.choice(samples)
+        low, high = AMOUNT_RANGES.get(category, (50, 2000))
+        yield (
+            i % users + 1,
+            title + rng.choice(SUFFIXES),
+            round(rng.uniform(low, high), 2),
+            category,
+            start + timedelta(days=rng.randrange(span)),
+        )
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _copy_postgres(engine, rows):
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for chunk in _chunks(rows, CHUNK_SIZE):
+            buf = io.StringIO()
+            csv.writer(buf).writerows(chunk)
+            buf.seek(0)
+            cursor.copy_expert("COPY expenses (user_id, title, amount, category, date) FROM STDIN WITH CSV", buf)
+        raw.commit()
+    finally:
+        raw.close()
+
+def _insert_many(engine, rows):
+    with engine.begin() as conn:
+        for chunk in _chunks(rows, CHUNK_SIZE):
+            conn.execute(insert(models.Expense), [
+                {"user_id": u, "title": t, "amount": a, "category": c, "date": d} for u, t, a, c, d in chunk
+            ])
+
+def _reset(engine):
+    models.Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+def _migrate(engine):
+    # The migrations, not create_all, so Postgres gets the partitioned expenses table.
+    cfg = Config(str(ROOT / "alembic.ini"))
+    cfg.set_main_option("script_location", str(ROOT / "migrations"))
+    with engine.connect() as conn:
+        cfg.attributes["connection"] = conn
+        command.upgrade(cfg, "head")
+        conn.commit()
+
+def _create_users(engine, users):
+    # Every seeded user shares one hash; hashing 10k passwords would dominate the seed time.
+    password_hash = auth.hash_password(PASSWORD)
+    with engine.begin() as conn:
+        existing = conn.execute(select(func.max(models.User.id))).scalar() or 0
+        for chunk in _chunks(range(existing + 1, users + 1), CHUNK_SIZE):
+            conn.execute(insert(models.User), [
+                {"id": i, "username": username(i), "password_hash": password_hash, "created_at": datetime.utcnow()}
+                for i in chunk
+            ])
+        if engine.dialect.name == "postgresql" and users > existing:
+            conn.execute(text("SELECT setval('users_id_seq', :n)"), {"n": users})
+
+async def _rebuild_rollup(url):
+    engine = database.make_async_engine(url)
+    try:
+        async with async_sessionmaker(bind=engine)() as db:
+            return await rollup.rebuild(db)
+    finally:
+        await engine.dispose()
+
+def seed(url, rows, reset=True, years=3, seed_value=42, users=1):
+    engine = database.make_engine(url)
+    try:
+        if reset:
+            _reset(engine)
+        _migrate(engine)
+        _create_users(engine, users)
+        started = time.perf_counter()
+        data = generate(rows, years=years, seed=seed_value, users=users)
+        if engine.dialect.name == "postgresql":
+            _copy_postgres(engine, data)
+        else:
+            _insert_many(engine, data)
+        inserted = time.perf_counter() - started
+    finally:
+        engine.dispose()
+    asyncio.run(_rebuild_rollup(url))
+    return {"rows": rows, "users": users, "insert_seconds": round(inserted, 2), "total_seconds": round(time.perf_counter() - started, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic expenses for benchmarking")
+    parser.add_argument("--url", required=True, help="database URL to seed (tables are dropped unless --append)")
+    parser.add_argument("--rows", default="10k", help="row count, e.g. 10k, 1m, 10m")
+    parser.add_argument("--users", default="1", help=f"users to spread rows over; each has password {PASSWORD!r}")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--append", action="store_true")
+    args = parser.parse_args()
+    print(seed(args.url, parse_size(args.rows), reset=not args.append, years=args.years, users=parse_size(args.users)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import cache, database, models, pagination, schemas
+from benchmarks import explain, seed
+
+def _validate():
+    # What response_model does for each object; pydantic 2 renamed from_orm.
+    if hasattr(schemas.Expense, "model_validate"):
+        return lambda e: schemas.Expense.model_validate(e, from_attributes=True)
+    return schemas.Expense.from_orm
+
+def _paths(user_id, limit, fields):
+    validate = _validate()
+    orm = select(models.Expense).where(models.Expense.user_id == user_id).limit(limit)
+
+    async def orm_pydantic(db):
+        rows = (await db.scalars(orm)).all()
+        return json.dumps(jsonable_encoder([validate(e) for e in rows])).encode()
+
+    async def orm_dicts(db):
+        rows = (await db.scalars(orm)).all()
+        dicts = [{c: getattr(e, c) for c in pagination.EXPORT_COLUMNS} for e in rows]
+        return json.dumps(jsonable_encoder(dicts), separators=(",", ":")).encode()
+
+    def tuples(selected):
+        stmt = pagination.select_fields(selected).where(models.Expense.user_id == user_id).limit(limit)
+
+        async def run(db):
+            return cache.dumps(pagination.to_dicts((await db.execute(stmt)).all(), selected))
+        return run
+
+    return {
+        "ORM + pydantic + json": orm_pydantic,
+        "ORM + dicts + json": orm_dicts,
+        "tuples + orjson": tuples(pagination.EXPORT_COLUMNS),
+        f"tuples + orjson, fields={','.join(fields)}": tuples(fields),
+    }
+
+async def measure(url, user_id, limit, fields, repeat):
+    engine = database.make_async_engine(url)
+    results = []
+    try:
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            for name, run in _paths(user_id, limit, fields).items():
+                body = await run(db)
+                timings = []
+                for _ in range(repeat):
+                    db.expunge_all()
+                    started = time.perf_counter()
+                    body = await run(db)
+                    timings.append(time.perf_counter() - started)
+                seconds = statistics.median(timings)
+                row = {"path": name, "rows": limit, "ms": round(seconds * 1000, 1), "bytes": len(body),
+                       "mb_per_s": round(len(body) / seconds / 1e6, 1)}
+                for encoding, compress in cache.COMPRESSORS.items():
+                    started = time.perf_counter()
+                    packed = compress(body)
+                    row[f"{encoding}_bytes"] = len(packed)
+                    row[f"{encoding}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                results.append(row)
+    finally:
+        await engine.dispose()
+    return results
+
+def print_table(results):
+    encodings = list(cache.COMPRESSORS)
+    print(f"{'path':<44}{'ms':>9}{'bytes':>12}{'MB/s':>9}" + "".join(f"{e + ' bytes':>13}{e + ' ms':>9}" for e in encodings))
+    for r in results:
+        print(f"{r['path']:<44}{r['ms']:>9}{r['bytes']:>12,}{r['mb_per_s']:>9}"
+              + "".join(f"{r[e + '_bytes']:>13,}{r[e + '_ms']:>9}" for e in encodings))
+
+def main():
+    parser = argparse.ArgumentParser(description="Time list-page serialization paths on a seeded table")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), required=os.getenv("DATABASE_URL") is None,
+                        help="database URL (tables are dropped and reseeded unless they already hold --rows rows)")
+    parser.add_argument("--rows", default="100k", help="row count to seed")
+    parser.add_argument("--limit", type=int, default=10_000, help="rows per page")
+    parser.add_argument("--fields", default="id,amount,date")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    rows = seed.parse_size(args.rows)
+    if asyncio.run(explain.count_expenses(args.url)) < rows:
+        print(f"Seeding {rows:,} rows...")
+        seed.seed(args.url, rows)
+    results = asyncio.run(measure(args.url, 1, args.limit, pagination.parse_fields(args.fields), args.repeat))
+    print_table(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
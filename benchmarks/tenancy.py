@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import time
+from datetime import date
+from pathlib import Path
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import database, models
+from benchmarks import explain, seed
+
+PARTITION = re.compile(r"\bexpenses_p\d+\b")
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+async def _partitions_scanned(engine, db, dialect, run):
+    if dialect != "postgresql":
+        return None
+    statement, parameters = (await explain.capture_statements(engine, db, run))[-1]
+    plan = await explain.query_plan(db, dialect, statement, parameters, analyze=False)
+    return len({m for line in plan for m in PARTITION.findall(line)})
+
+async def measure(url, users, samples, seed_value=11):
+    engine = database.make_async_engine(url)
+    dialect = engine.dialect.name
+    rng = random.Random(seed_value)
+    results = []
+    try:
+        await explain.prepare(engine, dialect)
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            newest = await db.scalar(select(func.max(models.Expense.date))) or date.today()
+            sampled = [rng.randint(1, users) for _ in range(samples)]
+            names = explain.hot_queries(newest, 1)
+            for name in names:
+                await names[name](db)
+                timings = []
+                for user_id in sampled:
+                    run = explain.hot_queries(newest, user_id)[name]
+                    started = time.perf_counter()
+                    await run(db)
+                    timings.append((time.perf_counter() - started) * 1000)
+                results.append({
+                    "query": name,
+                    "p50_ms": round(percentile(timings, 50), 3),
+                    "p95_ms": round(percentile(timings, 95), 3),
+                    "mean_ms": round(statistics.fmean(timings), 3),
+                    "partitions": await _partitions_scanned(
+                        engine, db, dialect, explain.hot_queries(newest, sampled[0])[name]),
+                })
+    finally:
+        await engine.dispose()
+    return results
+
+def print_table(report):
+    names = [r["query"] for r in report[0]["queries"]]
+    header = "".join(f"{r['users']:>12,}" for r in report)
+    print(f"{'p50 ms / users':<24}{header}")
+    for i, name in enumerate(names):
+        print(f"{name:<24}" + "".join(f"{r['queries'][i]['p50_ms']:>12}" for r in report))
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user query latency as the number of users grows")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), required=os.getenv("DATABASE_URL") is None,
+                        help="database URL (dropped and reseeded for every user count)")
+    parser.add_argument("--users", default="100,1k,10k", help="comma separated user counts")
+    parser.add_argument("--rows-per-user", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=200, help="random users timed per query")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = []
+    for size in args.users.split(","):
+        users = seed.parse_size(size)
+        rows = users * args.rows_per_user
+        print(f"== {users:,} users, {rows:,} rows")
+        seeded = seed.seed(args.url, rows, users=users)
+        report.append({"users": users, "rows": rows, "seed": seeded,
+                       "queries": asyncio.run(measure(args.url, users, args.samples))})
+    print_table(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
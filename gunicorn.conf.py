@@ -0,0 +1,65 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Multi-worker deployment: gunicorn -c gunicorn.conf.py
+# The app and classifier are built once in the master, and workers fork from it.
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+wsgi_app = "app.main:create_app(preload_model=True)"
+preload_app = True
+graceful_timeout = 30
+keepalive = 5
+
+# Work that must happen once per host, not once per worker. The master
+# creates missing tables and starts a single `python -m app.jobs worker`
+# that runs the job queue and snapshot compaction; the API workers do
+# neither. Production schemas still come from `alembic upgrade head`.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+SNAPSHOT_SECONDS = float(os.getenv("ANALYTICS_SNAPSHOT_SECONDS", "0"))
+AUTO_CREATE_SCHEMA = os.getenv("AUTO_CREATE_SCHEMA", "1") == "1"
+os.environ.update(JOB_WORKERS="0", ANALYTICS_SNAPSHOT_SECONDS="0", AUTO_CREATE_SCHEMA="0")
+
+# Set before the app is imported, so every worker shares the response and
+# classifier cache, and /metrics reports all workers.
+os.environ.setdefault("CACHE_BACKEND", "shared")
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "expense-metrics"))
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+_background = None
+
+def on_starting(server):
+    global _background
+    from app import cache, database, models
+    if AUTO_CREATE_SCHEMA:
+        models.Base.metadata.create_all(database.engine)
+        database.engine.dispose()
+    # Cached bodies are keyed by data version, which restarts at 1 on a new
+    # database; start every deployment with an empty cache.
+    cache.get_backend().clear()
+    if JOB_WORKERS > 0 or SNAPSHOT_SECONDS > 0:
+        _background = subprocess.Popen([
+            sys.executable, "-m", "app.jobs", "worker",
+            "--workers", str(JOB_WORKERS), "--snapshot-seconds", str(SNAPSHOT_SECONDS),
+        ])
+        server.log.info("Started background worker %s", _background.pid)
+
+def on_exit(server):
+    if _background is not None:
+        _background.terminate()
+        try:
+            _background.wait(timeout=graceful_timeout)
+        except subprocess.TimeoutExpired:
+            _background.kill()
+
+def post_fork(server, worker):
+    from app import database
+    database.after_fork()
+
+def child_exit(server, worker):
+    from app import metrics
+    metrics.mark_process_dead(worker.pid)
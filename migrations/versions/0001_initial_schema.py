@@ -0,0 +1,51 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "expenses",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String()),
+        sa.Column("amount", sa.Float()),
+        sa.Column("category", sa.String()),
+        sa.Column("date", sa.Date()),
+    )
+    op.create_index("ix_expenses_id", "expenses", ["id"])
+    op.create_index("ix_expenses_date_id", "expenses", ["date", "id"])
+    op.create_table(
+        "monthly_totals",
+        sa.Column("month", sa.String(7), primary_key=True),
+        sa.Column("category", sa.String(), primary_key=True),
+        sa.Column("total", sa.Float(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "budgets",
+        sa.Column("month", sa.String(7), primary_key=True),
+        sa.Column("category", sa.String(), primary_key=True),
+        sa.Column("amount", sa.Float(), nullable=False),
+    )
+    op.create_table(
+        "data_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table("data_version")
+    op.drop_table("budgets")
+    op.drop_table("monthly_totals")
+    op.drop_index("ix_expenses_date_id", table_name="expenses")
+    op.drop_index("ix_expenses_id", table_name="expenses")
+    op.drop_table("expenses")
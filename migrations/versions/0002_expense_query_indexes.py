@@ -0,0 +1,28 @@
+"""indexes for category and date-range queries
+
+Revision ID: 0002
+Revises: 0001
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ("ix_expenses_category_date_id", ["category", "date", "id"]),
+    ("ix_expenses_date_category_amount", ["date", "category", "amount"]),
+)
+
+def upgrade():
+    # CONCURRENTLY can't run inside a transaction; it keeps writes flowing while
+    # Postgres builds the indexes on a large table.
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, "expenses", columns, postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.drop_index(name, table_name="expenses", postgresql_concurrently=True, if_exists=True)
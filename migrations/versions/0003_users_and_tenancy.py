@@ -0,0 +1,186 @@
+"""users, per-user expenses and hash partitioning on Postgres
+
+Revision ID: 0003
+Revises: 0002
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+PARTITIONS = 16
+LEGACY_USERNAME = "admin"
+OLD_INDEXES = (
+    ("ix_expenses_date_id", ["date", "id"]),
+    ("ix_expenses_category_date_id", ["category", "date", "id"]),
+    ("ix_expenses_date_category_amount", ["date", "category", "amount"]),
+)
+USER_INDEXES = (
+    ("ix_expenses_user_date_id", ["user_id", "date", "id"]),
+    ("ix_expenses_user_category_date_id", ["user_id", "category", "date", "id"]),
+    ("ix_expenses_user_date_category_amount", ["user_id", "date", "category", "amount"]),
+)
+
+def _rows(name, columns):
+    # Typed selects, so SQLite hands back datetimes rather than strings.
+    table = sa.Table(name, sa.MetaData(), *columns)
+    return [dict(r) for r in op.get_bind().execute(sa.select(table)).mappings()]
+
+def _recreate(name, columns, rows):
+    # The side tables are small (one row per month and category), so they are
+    # rebuilt from memory rather than altered in place.
+    op.drop_table(name)
+    table = op.create_table(name, *columns)
+    if rows:
+        op.bulk_insert(table, rows)
+
+def _side_tables(user_id=True):
+    def user():
+        return [sa.Column("user_id", sa.Integer(), primary_key=True)] if user_id else []
+
+    return {
+        "monthly_totals": user() + [
+            sa.Column("month", sa.String(7), primary_key=True),
+            sa.Column("category", sa.String(), primary_key=True),
+            sa.Column("total", sa.Float(), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+        ],
+        "budgets": user() + [
+            sa.Column("month", sa.String(7), primary_key=True),
+            sa.Column("category", sa.String(), primary_key=True),
+            sa.Column("amount", sa.Float(), nullable=False),
+        ],
+        "data_version": (user() or [sa.Column("id", sa.Integer(), primary_key=True)]) + [
+            sa.Column("version", sa.BigInteger(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        ],
+    }
+
+def _legacy_user(bind):
+    # Existing single-tenant data is handed to one account. Its password hash
+    # is unusable until set with `python -m app.auth set-password admin`.
+    has_data = any(bind.execute(sa.text(f"SELECT 1 FROM {t} LIMIT 1")).first() for t in ("expenses", "budgets"))
+    if not has_data:
+        return None
+    bind.execute(
+        sa.text("INSERT INTO users (username, password_hash, created_at) VALUES (:u, '!', :now)"),
+        {"u": LEGACY_USERNAME, "now": datetime.utcnow()},
+    )
+    return bind.execute(sa.text("SELECT id FROM users WHERE username = :u"), {"u": LEGACY_USERNAME}).scalar()
+
+def _partition_expenses(legacy_id):
+    # A partitioned table's primary key has to include the partition key, and
+    # an existing table can't be converted in place, so the rows are copied.
+    op.execute("ALTER TABLE expenses RENAME TO expenses_unpartitioned")
+    op.execute("ALTER TABLE expenses_unpartitioned RENAME CONSTRAINT expenses_pkey TO expenses_unpartitioned_pkey")
+    op.execute("ALTER SEQUENCE expenses_id_seq OWNED BY NONE")
+    op.execute(
+        "CREATE TABLE expenses ("
+        " id integer NOT NULL DEFAULT nextval('expenses_id_seq'),"
+        " user_id integer NOT NULL REFERENCES users (id),"
+        " title varchar, amount double precision, category varchar, date date,"
+        " PRIMARY KEY (user_id, id)"
+        ") PARTITION BY HASH (user_id)"
+    )
+    for n in range(PARTITIONS):
+        op.execute(f"CREATE TABLE expenses_p{n:02d} PARTITION OF expenses "
+                   f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {n})")
+    if legacy_id is not None:
+        op.execute(sa.text(
+            "INSERT INTO expenses (id, user_id, title, amount, category, date) "
+            "SELECT id, :user_id, title, amount, category, date FROM expenses_unpartitioned"
+        ).bindparams(user_id=legacy_id))
+    op.execute("DROP TABLE expenses_unpartitioned")
+    op.execute("ALTER SEQUENCE expenses_id_seq OWNED BY expenses.id")
+    # Built after the copy; indexes on the parent cascade to every partition.
+    op.create_index("ix_expenses_id", "expenses", ["id"])
+    for name, columns in USER_INDEXES:
+        op.create_index(name, "expenses", columns)
+
+def _add_expense_owner(legacy_id):
+    op.add_column("expenses", sa.Column("user_id", sa.Integer()))
+    if legacy_id is not None:
+        op.execute(sa.text("UPDATE expenses SET user_id = :user_id").bindparams(user_id=legacy_id))
+    with op.batch_alter_table("expenses") as batch:
+        batch.alter_column("user_id", existing_type=sa.Integer(), nullable=False)
+        batch.create_foreign_key("fk_expenses_user_id_users", "users", ["user_id"], ["id"])
+        for name, _ in OLD_INDEXES:
+            batch.drop_index(name)
+        for name, columns in USER_INDEXES:
+            batch.create_index(name, columns)
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), nullable=False, unique=True),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    bind = op.get_bind()
+    legacy_id = _legacy_user(bind)
+    if bind.dialect.name == "postgresql":
+        _partition_expenses(legacy_id)
+    else:
+        _add_expense_owner(legacy_id)
+    old = _side_tables(user_id=False)
+    for name, columns in _side_tables().items():
+        rows = _rows(name, old[name]) if legacy_id is not None else []
+        for row in rows:
+            row.pop("id", None)
+            row["user_id"] = legacy_id
+        _recreate(name, columns, rows)
+
+def downgrade():
+    # Folds every user's data back into the single-tenant layout.
+    bind = op.get_bind()
+    totals, budgets, version = {}, {}, None
+    current = _side_tables()
+    for row in _rows("monthly_totals", current["monthly_totals"]):
+        entry = totals.setdefault((row["month"], row["category"]), {**row, "total": 0.0, "count": 0})
+        entry["total"] += row["total"]
+        entry["count"] += row["count"]
+    for row in sorted(_rows("budgets", current["budgets"]), key=lambda r: r["user_id"]):
+        budgets.setdefault((row["month"], row["category"]), row)
+    for row in _rows("data_version", current["data_version"]):
+        if version is None or row["version"] > version["version"]:
+            version = row
+    side = {
+        "monthly_totals": list(totals.values()),
+        "budgets": list(budgets.values()),
+        "data_version": [{**version, "id": 1}] if version else [],
+    }
+    for name, columns in _side_tables(user_id=False).items():
+        for row in side[name]:
+            row.pop("user_id", None)
+        _recreate(name, columns, side[name])
+
+    if bind.dialect.name == "postgresql":
+        op.execute("ALTER TABLE expenses RENAME TO expenses_partitioned")
+        op.execute("ALTER TABLE expenses_partitioned RENAME CONSTRAINT expenses_pkey TO expenses_partitioned_pkey")
+        op.execute("ALTER SEQUENCE expenses_id_seq OWNED BY NONE")
+        op.execute(
+            "CREATE TABLE expenses ("
+            " id integer PRIMARY KEY DEFAULT nextval('expenses_id_seq'),"
+            " title varchar, amount double precision, category varchar, date date)"
+        )
+        op.execute("INSERT INTO expenses (id, title, amount, category, date) "
+                   "SELECT id, title, amount, category, date FROM expenses_partitioned")
+        op.execute("DROP TABLE expenses_partitioned")
+        op.execute("ALTER SEQUENCE expenses_id_seq OWNED BY expenses.id")
+        op.create_index("ix_expenses_id", "expenses", ["id"])
+        for name, columns in OLD_INDEXES:
+            op.create_index(name, "expenses", columns)
+    else:
+        with op.batch_alter_table("expenses") as batch:
+            for name, _ in USER_INDEXES:
+                batch.drop_index(name)
+            batch.drop_constraint("fk_expenses_user_id_users", type_="foreignkey")
+            batch.drop_column("user_id")
+            for name, columns in OLD_INDEXES:
+                batch.create_index(name, columns)
+    op.drop_table("users")
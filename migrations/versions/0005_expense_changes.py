@@ -0,0 +1,30 @@
+"""expense change feed
+
+Revision ID: 0005
+Revises: 0004
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "expense_changes",
+        # SQLite only autoincrements an INTEGER primary key.
+        sa.Column("seq", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("expense_id", sa.Integer(), nullable=False),
+        sa.Column("op", sa.String(), nullable=False),
+        sa.Column("before", sa.JSON()),
+        sa.Column("after", sa.JSON()),
+        sa.Column("changed_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_expense_changes_user_id_seq", "expense_changes", ["user_id", "seq"])
+
+def downgrade():
+    op.drop_index("ix_expense_changes_user_id_seq", table_name="expense_changes")
+    op.drop_table("expense_changes")
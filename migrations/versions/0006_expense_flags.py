@@ -0,0 +1,26 @@
+"""duplicate and outlier flags
+
+Revision ID: 0006
+Revises: 0005
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "expense_flags",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("expense_id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(), primary_key=True),
+        sa.Column("score", sa.Float()),
+        sa.Column("related_id", sa.Integer()),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table("expense_flags")
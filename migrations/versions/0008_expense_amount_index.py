@@ -0,0 +1,19 @@
+"""index for per-write duplicate lookups by amount
+
+Revision ID: 0008
+Revises: 0007
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # On Postgres this builds on the partitioned parent and cascades to every
+    # partition; CONCURRENTLY isn't supported there.
+    op.create_index("ix_expenses_user_amount", "expenses", ["user_id", "amount"])
+
+def downgrade():
+    op.drop_index("ix_expenses_user_amount", table_name="expenses")
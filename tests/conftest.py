@@ -0,0 +1,76 @@
+import os
+import tempfile
+import uuid
+from types import SimpleNamespace
+import pytest
+
+# app.config reads the environment at import, so this has to run first.
+_tmp = tempfile.mkdtemp(prefix="expense-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_tmp}/test.db",
+    "ALLOW_INSECURE_SECRET": "1",
+    "PASSWORD_ITERATIONS": "1000",
+    "CACHE_BACKEND": "memory",
+    "JOB_WORKERS": "0",
+    "MODEL_POLL_SECONDS": "0",
+    "MODEL_DIR": os.path.join(_tmp, "models"),
+    "ANALYTICS_DIR": os.path.join(_tmp, "analytics"),
+    "JOB_DIR": os.path.join(_tmp, "jobs"),
+})
+
+from fastapi.testclient import TestClient
+from app import cache, main
+
+class DictBackend(cache.CacheBackend):
+    # Local stand-in for a shared cache: a plain dict that records every write.
+    def __init__(self):
+        self.entries = {}
+        self.writes = []
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+        self.writes.append(key)
+
+    def clear(self):
+        self.entries.clear()
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.create_app()) as client:
+        yield client
+
+@pytest.fixture
+def cache_backend():
+    previous = cache.get_backend()
+    backend = DictBackend()
+    cache.configure(backend)
+    yield backend
+    cache.configure(previous)
+
+def _register(client):
+    username = f"user-{uuid.uuid4().hex[:12]}"
+    created = client.post("/auth/register", json={"username": username, "password": "password1"})
+    assert created.status_code == 201
+    token = client.post("/auth/token", json={"username": username, "password": "password1"}).json()["access_token"]
+    return SimpleNamespace(id=created.json()["id"], username=username, token=token,
+                           headers={"Authorization": f"Bearer {token}"})
+
+@pytest.fixture
+def user(client):
+    return _register(client)
+
+@pytest.fixture
+def other_user(client):
+    return _register(client)
+
+@pytest.fixture
+def add_expense(client):
+    def add(user, title="Coffee", amount=3.5, category="Food", date="2026-01-15", headers=None):
+        response = client.post("/expenses/", json={"title": title, "amount": amount, "category": category, "date": date},
+                               headers={**user.headers, **(headers or {})})
+        assert response.status_code == 200, response.text
+        return response.json()
+    return add
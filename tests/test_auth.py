@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import delete
+from app import auth, config, database, main, models
+
+def _link_token(client, user):
+    response = client.post("/expenses/export/link", headers=user.headers)
+    assert response.status_code == 200
+    return response.json()["token"]
+
+def test_export_link_downloads_without_a_header(client, user, add_expense):
+    add_expense(user, title="Groceries")
+    response = client.get("/expenses/export", params={"token": _link_token(client, user)})
+    assert response.status_code == 200
+    assert "Groceries" in response.text
+
+def test_link_token_is_not_a_bearer_token(client, user):
+    headers = {"Authorization": f"Bearer {_link_token(client, user)}"}
+    assert client.get("/expenses/summary", headers=headers).status_code == 401
+    assert client.get("/expenses/export", headers=headers).status_code == 401
+
+def test_link_token_only_works_on_its_path(client, user):
+    response = client.get("/expenses/changes/stream", params={"token": _link_token(client, user)})
+    assert response.status_code == 401
+
+def test_bearer_token_is_not_a_link_token(client, user):
+    assert client.get("/expenses/export", params={"token": user.token}).status_code == 401
+
+def test_expired_link_is_rejected(client, user):
+    token, _ = auth.issue_token(user.id, ttl=-1, scope="/expenses/export")
+    assert client.get("/expenses/export", params={"token": token}).status_code == 401
+
+def test_tampered_link_is_rejected(client, user, other_user):
+    token = _link_token(client, user)
+    forged = f"{other_user.id}.{token.split('.', 1)[1]}"
+    assert client.get("/expenses/export", params={"token": forged}).status_code == 401
+
+def test_tokens_of_a_deleted_user_are_rejected(client, user):
+    link = _link_token(client, user)
+    with database.engine.begin() as conn:
+        conn.execute(delete(models.User).where(models.User.id == user.id))
+    assert client.get("/expenses/summary", headers=user.headers).status_code == 401
+    assert client.get("/expenses/export", headers=user.headers).status_code == 401
+    assert client.get("/expenses/export", params={"token": link}).status_code == 401
+
+def test_app_refuses_to_start_without_a_secret(monkeypatch):
+    monkeypatch.setattr(config, "SECRET_KEY", "")
+    with pytest.raises(RuntimeError):
+        main.create_app()
@@ -0,0 +1,45 @@
+from app import bulk, config
+
+def _ids(client, user):
+    return sorted(e["id"] for e in client.get("/expenses/?limit=1000", headers=user.headers).json())
+
+def test_selector_is_required(client, user):
+    response = client.patch("/expenses/", json={"set": {"category": "Misc"}}, headers=user.headers)
+    assert response.status_code == 400
+
+def test_too_many_ids_are_rejected(client, user):
+    ids = list(range(1, bulk.MAX_IDS + 2))
+    assert client.patch("/expenses/", json={"ids": ids, "set": {"category": "Misc"}},
+                        headers=user.headers).status_code == 400
+    assert client.request("DELETE", "/expenses/", json={"ids": ids}, headers=user.headers).status_code == 400
+    assert client.request("DELETE", "/expenses/", json={"ids": []}, headers=user.headers).status_code == 400
+
+def test_oversized_match_changes_nothing(client, user, add_expense, monkeypatch):
+    monkeypatch.setattr(config, "BULK_MAX_ROWS", 2)
+    for amount in (1, 2, 3):
+        add_expense(user, amount=amount, category="Food")
+    before = client.get("/expenses/?limit=1000", headers=user.headers).json()
+
+    patched = client.patch("/expenses/", json={"category": "Food", "set": {"category": "Misc"}}, headers=user.headers)
+    deleted = client.request("DELETE", "/expenses/", json={"category": "Food"}, headers=user.headers)
+    assert patched.status_code == deleted.status_code == 400
+    assert "3 expenses match" in deleted.json()["detail"]
+    assert client.get("/expenses/?limit=1000", headers=user.headers).json() == before
+
+def test_match_within_the_limit_is_applied(client, user, add_expense, monkeypatch):
+    monkeypatch.setattr(config, "BULK_MAX_ROWS", 2)
+    kept = add_expense(user, category="Travel")
+    for amount in (1, 2):
+        add_expense(user, amount=amount, category="Food")
+    response = client.request("DELETE", "/expenses/", json={"category": "Food"}, headers=user.headers)
+    assert response.status_code == 200
+    assert response.json()["deleted"] == 2
+    assert _ids(client, user) == [kept["id"]]
+
+def test_bulk_writes_only_touch_the_callers_rows(client, user, other_user, add_expense):
+    theirs = add_expense(other_user)
+    response = client.patch("/expenses/", json={"ids": [theirs["id"]], "set": {"category": "Misc"}},
+                            headers=user.headers)
+    assert response.status_code == 200
+    assert response.json()["updated"] == 0
+    assert _ids(client, other_user) == [theirs["id"]]
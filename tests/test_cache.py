@@ -0,0 +1,53 @@
+from app import summary
+
+def test_unchanged_data_gets_304(client, user, add_expense):
+    add_expense(user)
+    first = client.get("/expenses/summary", headers=user.headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    again = client.get("/expenses/summary", headers={**user.headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+def test_write_changes_etag(client, user, add_expense):
+    add_expense(user, amount=10)
+    first = client.get("/expenses/summary", headers=user.headers)
+    add_expense(user, amount=5)
+    after = client.get("/expenses/summary", headers={**user.headers, "If-None-Match": first.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != first.headers["ETag"]
+    assert after.json() != first.json()
+
+def test_if_modified_since_alone_is_not_304(client, user, add_expense):
+    add_expense(user)
+    first = client.get("/expenses/summary", headers=user.headers)
+    add_expense(user, amount=7)
+    after = client.get("/expenses/summary", headers={**user.headers, "If-Modified-Since": first.headers["Last-Modified"]})
+    assert after.status_code == 200
+
+def test_backend_serves_repeat_reads_until_a_write(client, user, add_expense, cache_backend, monkeypatch):
+    calls = []
+    overview = summary.overview
+
+    async def counted(*args, **kwargs):
+        calls.append(args)
+        return await overview(*args, **kwargs)
+
+    monkeypatch.setattr(summary, "overview", counted)
+    add_expense(user)
+    client.get("/expenses/summary", headers=user.headers)
+    client.get("/expenses/summary", headers=user.headers)
+    assert len(calls) == 1
+    assert len(cache_backend.writes) == 1
+
+    # A write bumps the user's data version, so the next read misses.
+    add_expense(user, amount=2)
+    client.get("/expenses/summary", headers=user.headers)
+    assert len(calls) == 2
+
+def test_users_do_not_share_entries(client, user, other_user, add_expense, cache_backend):
+    add_expense(user, amount=100)
+    mine = client.get("/expenses/summary", headers=user.headers).json()
+    theirs = client.get("/expenses/summary", headers=other_user.headers).json()
+    assert mine != theirs
+    assert len(cache_backend.writes) == 2
@@ -0,0 +1,34 @@
+from app import idempotency
+
+EXPENSE = {"title": "Rent", "amount": 900, "category": "Housing", "date": "2026-02-01"}
+
+def _post(client, user, key, body=EXPENSE):
+    return client.post("/expenses/", json=body, headers={**user.headers, "Idempotency-Key": key})
+
+def _titles(client, user):
+    return [e["title"] for e in client.get("/expenses/?limit=1000", headers=user.headers).json()]
+
+def test_retry_replays_the_first_response(client, user):
+    first = _post(client, user, "rent-february")
+    retry = _post(client, user, "rent-february")
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers[idempotency.REPLAYED_HEADER] == "true"
+    assert idempotency.REPLAYED_HEADER not in first.headers
+    assert _titles(client, user) == ["Rent"]
+
+def test_same_key_with_another_body_is_rejected(client, user):
+    _post(client, user, "rent-march")
+    reused = _post(client, user, "rent-march", {**EXPENSE, "amount": 950})
+    assert reused.status_code == 422
+    assert _titles(client, user) == ["Rent"]
+
+def test_keys_are_per_user(client, user, other_user):
+    mine = _post(client, user, "shared-key")
+    theirs = _post(client, other_user, "shared-key")
+    assert theirs.status_code == 200
+    assert idempotency.REPLAYED_HEADER not in theirs.headers
+    assert theirs.json()["id"] != mine.json()["id"]
+
+def test_overlong_key_is_rejected(client, user):
+    assert _post(client, user, "k" * (idempotency.MAX_KEY_LENGTH + 1)).status_code == 400
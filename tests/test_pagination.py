@@ -0,0 +1,33 @@
+def _pages(client, user, limit, between_pages=None):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/expenses/page", params=params, headers=user.headers)
+        assert response.status_code == 200
+        page = response.json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return seen
+        if between_pages is not None:
+            between_pages()
+
+def test_pages_cover_every_row_once(client, user, add_expense):
+    ids = [add_expense(user, amount=i, date=f"2026-01-{1 + i % 5:02d}")["id"] for i in range(11)]
+    seen = _pages(client, user, limit=3)
+    assert sorted(seen) == sorted(ids)
+    assert len(seen) == len(set(seen))
+
+def test_inserts_between_pages_do_not_shift_the_cursor(client, user, add_expense):
+    ids = [add_expense(user, amount=i, date=f"2026-03-{10 + i:02d}")["id"] for i in range(9)]
+    dates = iter(["2026-03-30", "2026-03-01", "2026-03-14", "2026-03-31"])
+
+    # Rows land before, after and amid what has been read; none of the
+    # original rows may be skipped or repeated.
+    seen = _pages(client, user, limit=2, between_pages=lambda: add_expense(user, date=next(dates, "2026-04-01")))
+    assert set(ids) <= set(seen)
+    assert len(seen) == len(set(seen))
+
+def test_invalid_cursor_is_rejected(client, user):
+    response = client.get("/expenses/page", params={"cursor": "not-a-cursor"}, headers=user.headers)
+    assert response.status_code == 400
@@ -0,0 +1,10 @@
+def test_weekly_total_matches_a_direct_sum(client, user, add_expense):
+    # Each day rounds down to 10.00 on its own; the week's exact sum is 30.012.
+    for day in ("2026-03-02", "2026-03-03", "2026-03-04"):
+        add_expense(user, amount=10.004, date=day)
+    weekly = client.get("/expenses/summary/weekly", headers=user.headers).json()
+    overview = client.get("/expenses/summary", headers=user.headers).json()
+    assert weekly == [{"week": "2026-W10", "total": 30.01, "count": 3}]
+    assert overview["weekly"] == weekly
+    assert overview["range"]["total"] == 30.01
+    assert [d["total"] for d in overview["daily"]] == [10.0, 10.0, 10.0]
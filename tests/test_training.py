@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from app import config, database, model_store, models, training
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "MODEL_DIR", str(tmp_path))
+    return tmp_path
+
+def _age_changes(minutes):
+    with database.engine.begin() as conn:
+        conn.execute(update(models.ExpenseChange).values(changed_at=datetime.utcnow() - timedelta(minutes=minutes)))
+
+def _trained_ids(monkeypatch):
+    seen = []
+    stream = training.stream_labelled
+
+    def recording(*args, **kwargs):
+        for rows in stream(*args, **kwargs):
+            seen.extend(r[0] for r in rows)
+            yield rows
+
+    monkeypatch.setattr(training, "stream_labelled", recording)
+    return seen
+
+def test_incremental_run_retrains_corrections(client, user, add_expense, model_dir, monkeypatch):
+    ids = [add_expense(user, title=f"item {i}", category="Food")["id"] for i in range(4)]
+    _age_changes(60)
+    assert training.train(database.engine)["mode"] == "full"
+
+    client.patch("/expenses/", json={"ids": ids[:2], "set": {"category": "Travel"}}, headers=user.headers)
+    client.patch("/expenses/", json={"ids": ids[2:3], "set": {"amount": 99}}, headers=user.headers)
+    added = add_expense(user, title="taxi", category="Travel")["id"]
+    _age_changes(60)
+    seen = _trained_ids(monkeypatch)
+    manifest = training.train(database.engine)
+    assert manifest["mode"] == "incremental"
+    assert sorted(seen) == sorted(ids[:2] + [added])
+
+def test_changes_inside_the_settle_time_wait_for_the_next_run(client, user, add_expense, model_dir, monkeypatch):
+    add_expense(user, title="groceries", category="Food")
+    _age_changes(60)
+    training.train(database.engine)
+
+    # Not yet settled: its transaction could still have a smaller seq in flight.
+    recent = add_expense(user, title="flight", category="Travel")["id"]
+    seen = _trained_ids(monkeypatch)
+    assert training.train(database.engine) is None
+    assert seen == []
+
+    _age_changes(60)
+    manifest = training.train(database.engine)
+    assert manifest["mode"] == "incremental"
+    assert seen == [recent]
+    assert model_store.read_manifest()["trained_through_seq"] == manifest["trained_through_seq"]
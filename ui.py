@@ -1,110 +1,244 @@
 import streamlit as st
 import requests
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import date
+from pathlib import Path
 import base64
-import joblib
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 
 st.set_page_config(page_title="Expense Tracker", layout="wide")
 
-@st.cache_resource
-def load_model():
-    return joblib.load("category_classifier.pkl")
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+# Where the user's browser reaches the API, for downloads that don't pass through this server.
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", API_URL)
+# Changes are picked up through the change feed, so the TTL only bounds memory.
+CACHE_TTL = 300
+WRITE_RETRIES = 2
 
-model = load_model()
+@st.cache_resource
+def api_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def auth_headers(token=None):
+    token = token or st.session_state.get("token")
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+def api_get(path, params=None, token=None):
+    response = api_session().get(f"{API_URL}{path}", params=params, headers=auth_headers(token), timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def write_key(action, payload):
+    # One key per pending write: a retry of the same payload reuses it, so the
+    # API applies the write once. Editing the form starts a new write.
+    pending = st.session_state.setdefault("pending_writes", {})
+    if action not in pending or pending[action][0] != payload:
+        pending[action] = (payload, str(uuid.uuid4()))
+    return pending[action][1]
+
+def api_write(method, path, payload, action):
+    headers = {**auth_headers(), "Idempotency-Key": write_key(action, payload)}
+    response = None
+    for attempt in range(WRITE_RETRIES + 1):
+        if attempt:
+            time.sleep(0.5 * attempt)
+        try:
+            response = api_session().request(method, f"{API_URL}{path}", json=payload, headers=headers, timeout=10)
+        except requests.RequestException:
+            continue
+        if response.status_code < 500:
+            break
+    if response is not None and response.status_code == 200:
+        st.session_state.pending_writes.pop(action, None)
+    return response
+
+def parse_ids(text):
+    try:
+        return sorted({int(part) for part in text.replace(",", " ").split()})
+    except ValueError:
+        return None
+
+# The token is part of the cache key, so one user's cached data is never shown to another.
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _fetch(token, path, params):
+    return api_get(path, dict(params), token)
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _fetch_many(token, calls):
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        return list(pool.map(lambda call: api_get(call[0], dict(call[1]), token), calls))
+
+def fetch(path, params=()):
+    return _fetch(st.session_state.token, path, params)
+
+def fetch_many(calls):
+    return _fetch_many(st.session_state.token, calls)
+
+def invalidate_cache():
+    _fetch.clear()
+    _fetch_many.clear()
+
+@st.cache_data(show_spinner=False)
+def categorize(title, _token):
+    response = api_session().post(f"{API_URL}/categorize", json={"title": title, "k": 3},
+                                  headers=auth_headers(_token), timeout=5)
+    response.raise_for_status()
+    return response.json()["results"][0]
 
 def predict_category(title):
     if title.strip():
-        return model.predict([title])[0]
-    return ""
-
-def get_img_as_base64(file_path):
-    with open(file_path, "rb") as f:
-        data = f.read()
-    return base64.b64encode(data).decode()
+        try:
+            return categorize(title.strip(), st.session_state.token)
+        except requests.RequestException:
+            return None
+    return None
 
-img_url = get_img_as_base64(r"C:\\Users\\krish\\OneDrive\\Desktop\\exp track monit\\str_ui\\bg.jpg")
+BACKGROUND_PATH = Path(__file__).resolve().parent / "str_ui" / "bg.jpg"
 
-st.markdown(
-    f"""
+@st.cache_resource
+def background_css(file_path=BACKGROUND_PATH):
+    try:
+        img_url = base64.b64encode(Path(file_path).read_bytes()).decode()
+    except OSError:
+        return ""
+    return f"""
     <style>
     .stApp {{
-        background-image: url("data:image/png;base64,{img_url}");
+        background-image: url("data:image/jpeg;base64,{img_url}");
         background-size: cover;
         background-position: center;
         background-repeat: no-repeat;
         background-attachment: fixed;
     }}
     </style>
-    """,
-    unsafe_allow_html=True
-)
+    """
+
+st.markdown(background_css(), unsafe_allow_html=True)
 
-API_URL = "http://localhost:8000"
+def request_token(username, password):
+    response = api_session().post(f"{API_URL}/auth/token", json={"username": username, "password": password}, timeout=10)
+    return response.json()["access_token"] if response.status_code == 200 else None
 
 def login():
-    if "logged_in" not in st.session_state:
-        st.session_state.logged_in = False
-    if "login_failed" not in st.session_state:
-        st.session_state.login_failed = False
+    if "token" not in st.session_state:
+        st.session_state.token = None
+    if "login_error" not in st.session_state:
+        st.session_state.login_error = None
 
-    if not st.session_state.logged_in:
+    if not st.session_state.token:
         with st.sidebar:
             st.title("🔐 Login")
             username = st.text_input("Username", key="user")
             password = st.text_input("Password", type="password", key="pass")
+            col1, col2 = st.columns(2)
 
-            if st.button("Login"):
-                if username == "admin" and password == "admin123":
-                    st.session_state.logged_in = True
-                    st.session_state.login_failed = False
-                    st.rerun()
-                else:
-                    st.session_state.login_failed = True
-
-            if st.session_state.login_failed:
-                st.error("❌ Incorrect username or password.")
+            try:
+                if col1.button("Login"):
+                    st.session_state.token = request_token(username, password)
+                    st.session_state.login_error = None if st.session_state.token else "❌ Incorrect username or password."
+                    if st.session_state.token:
+                        st.rerun()
+                if col2.button("Register"):
+                    res = api_session().post(f"{API_URL}/auth/register",
+                                             json={"username": username, "password": password}, timeout=10)
+                    if res.status_code == 201:
+                        st.session_state.token = request_token(username, password)
+                        st.session_state.login_error = None
+                        st.rerun()
+                    st.session_state.login_error = f"❌ {res.json().get('detail', 'Registration failed.')}"
+            except requests.RequestException:
+                st.session_state.login_error = "❌ Backend unavailable."
+
+            if st.session_state.login_error:
+                st.error(st.session_state.login_error)
 
         return False
     return True
 
-if "logged_in" in st.session_state and st.session_state.logged_in:
+if st.session_state.get("token"):
     if st.sidebar.button("🚪 Logout"):
-        st.session_state.logged_in = False
-        st.session_state.login_failed = False
+        st.session_state.token = None
+        st.session_state.login_error = None
+        st.session_state.pop("change_cursor", None)
         st.rerun()
 
 if not login():
     st.stop()
 
+def sync_changes():
+    # Writes from other clients and background imports show up in the feed;
+    # any change drops the cached pages so this run fetches fresh data.
+    cursor = st.session_state.get("change_cursor")
+    try:
+        feed = api_get("/expenses/changes", {"since": cursor} if cursor is not None else None)
+    except requests.HTTPError as e:
+        if e.response.status_code == 410:
+            invalidate_cache()
+            st.session_state.pop("change_cursor", None)
+        return
+    except requests.RequestException:
+        return
+    if feed["changes"]:
+        invalidate_cache()
+    st.session_state.change_cursor = feed["next"]
+
+sync_changes()
+
 st.title("💰 Expense Tracker")
 menu = st.sidebar.selectbox("Menu", ["Add Expense", "View & Analyze", "Update/Delete"])
-monthly_budget = st.sidebar.number_input("Set Monthly Budget 💸", min_value=0.0, value=10000.0)
+
+def load_budget(month):
+    try:
+        return fetch("/budget/status", (("month", month),))["budget"]
+    except requests.RequestException:
+        return None
+
+budget_month = date.today().strftime("%Y-%m")
+saved_budget = load_budget(budget_month)
+monthly_budget = st.sidebar.number_input(
+    "Set Monthly Budget 💸", min_value=0.0, value=saved_budget if saved_budget is not None else 10000.0
+)
+if st.sidebar.button("💾 Save Budget"):
+    try:
+        res = api_session().put(f"{API_URL}/budgets/{budget_month}", json={"amount": monthly_budget},
+                                headers=auth_headers(), timeout=10)
+        res.raise_for_status()
+    except requests.RequestException:
+        st.sidebar.error("Could not save budget.")
+    else:
+        invalidate_cache()
+        st.sidebar.success(f"Budget saved for {budget_month} onwards.")
 
 if menu == "Add Expense":
     st.subheader("➕ Add a New Expense")
     title = st.text_input("Title")
-    predicted_category = predict_category(title) if title else ""
+    prediction = predict_category(title) if title else None
+    predicted_category = prediction["category"] if prediction else ""
+    if prediction:
+        st.caption("Suggested: " + ", ".join(
+            f"{c['category']} ({c['probability']:.0%})" for c in prediction["candidates"]
+        ))
     amount = st.number_input("Amount", min_value=0.0, format="%.2f")
     category = st.text_input("Category", value=predicted_category)
     exp_date = st.date_input("Date", value=date.today())
 
     if amount > 0:
         try:
-            response = requests.get(f"{API_URL}/expenses/")
-            if response.status_code == 200:
-                data = response.json()
-                df = pd.DataFrame(data)
-                if not df.empty:
-                    df["date"] = pd.to_datetime(df["date"])
-                    df["month"] = df["date"].dt.to_period("M").astype(str)
-                    current_month = exp_date.strftime("%Y-%m")
-                    current_total = df[df["month"] == current_month]["amount"].sum()
-                    predicted_total = current_total + amount
-                    if predicted_total > monthly_budget:
-                        st.warning(f"⚠️ Adding ₹{amount:.2f} in {current_month} exceeds your budget ₹{monthly_budget:.2f} (Current: ₹{current_total:.2f}, After Add: ₹{predicted_total:.2f})")
+            current_month = exp_date.strftime("%Y-%m")
+            status = fetch("/budget/status", (("month", current_month), ("amount", amount)))
+            if status:
+                limit = status["budget"] if status["budget"] is not None else monthly_budget
+                current_total = status["current_total"]
+                predicted_total = status["projected_total"]
+                if predicted_total > limit:
+                    st.warning(f"⚠️ Adding ₹{amount:.2f} in {current_month} exceeds your budget ₹{limit:.2f} (Current: ₹{current_total:.2f}, After Add: ₹{predicted_total:.2f})")
         except Exception:
             st.info("Could not check budget. Backend may be unavailable.")
 
@@ -116,8 +250,9 @@ if menu == "Add Expense":
                 "category": category,
                 "date": str(exp_date)
             }
-            response = requests.post(f"{API_URL}/expenses/", json=payload)
-            if response.status_code == 200:
+            response = api_write("POST", "/expenses/", payload, "add")
+            if response is not None and response.status_code == 200:
+                invalidate_cache()
                 st.success("✅ Expense added successfully!")
             else:
                 st.error("❌ Failed to add expense.")
@@ -125,49 +260,80 @@ if menu == "Add Expense":
             st.warning("⚠️ Please fill all fields with valid data.")
 
 elif menu == "View & Analyze":
-    st.subheader("📊 View & Analyze Expenses")
-    response = requests.get(f"{API_URL}/expenses/")
-    if response.status_code == 200:
-        data = response.json()
-        if data:
-            df = pd.DataFrame(data)
-            df["date"] = pd.to_datetime(df["date"])
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
 
+    st.subheader("📊 View & Analyze Expenses")
+    try:
+        full_range = fetch("/expenses/summary/range")
+    except requests.RequestException:
+        full_range = None
+    if full_range is not None:
+        if full_range["count"]:
             st.write("### 📅 Filter by Date Range")
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             with col1:
-                start_date = st.date_input("Start Date", value=df["date"].min().date())
+                start_date = st.date_input("Start Date", value=date.fromisoformat(full_range["start"]))
             with col2:
-                end_date = st.date_input("End Date", value=df["date"].max().date())
+                end_date = st.date_input("End Date", value=date.fromisoformat(full_range["end"]))
+            with col3:
+                strategy = st.selectbox(
+                    "Forecast model",
+                    ["moving_average", "exponential_smoothing", "seasonal_naive", "linear_trend"],
+                    format_func=lambda s: s.replace("_", " ").title(),
+                )
 
             if start_date > end_date:
                 st.error("Start Date cannot be after End Date.")
                 st.stop()
 
-            filtered_df = df[(df["date"] >= pd.to_datetime(start_date)) & (df["date"] <= pd.to_datetime(end_date))]
+            date_filter = {"start": str(start_date), "end": str(end_date)}
+            date_params = tuple(date_filter.items())
+            try:
+                summary, page, forecast, flags = fetch_many((
+                    ("/expenses/summary", date_params),
+                    ("/expenses/page", date_params + (("limit", 1000),)),
+                    ("/expenses/forecast", (("strategy", strategy),)),
+                    ("/expenses/flags", date_params + (("limit", 1000),)),
+                ))
+            except requests.RequestException as e:
+                st.error(f"Error fetching expenses: {e}")
+                st.stop()
+            rows = page["items"]
+            marks = {}
+            for flag in flags:
+                note = (f"duplicate of #{flag['related_id']}" if flag["kind"] == "duplicate"
+                        else f"unusual amount (z={flag['score']:+.1f})")
+                marks.setdefault(flag["id"], []).append(note)
+            filtered_df = pd.DataFrame(rows)
+            if marks and not filtered_df.empty:
+                filtered_df.insert(0, "⚠️", filtered_df["id"].map(lambda i: "; ".join(marks.get(i, ()))))
             st.dataframe(filtered_df)
+            if marks:
+                st.caption(f"⚠️ Flagged as a likely duplicate or unusual amount: {len(marks)}")
+            if summary["range"]["count"] > len(rows):
+                st.caption(f"Showing {len(rows)} of {summary['range']['count']} expenses. Totals below cover all of them.")
 
-            filtered_df["month"] = filtered_df["date"].dt.to_period("M").astype(str)
-            monthly_summary = filtered_df.groupby("month")["amount"].sum().reset_index().rename(columns={"amount": "Total"})
+            monthly_summary = pd.DataFrame(summary["monthly"], columns=["month", "total"]).rename(columns={"total": "Total"})
             st.write("### 📆 Monthly Summary")
             st.table(monthly_summary)
             st.line_chart(monthly_summary.set_index("month"))
 
-            filtered_df["week"] = filtered_df["date"].dt.to_period("W").astype(str)
-            weekly_summary = filtered_df.groupby("week")["amount"].sum().reset_index().rename(columns={"amount": "Total"})
+            weekly_summary = pd.DataFrame(summary["weekly"], columns=["week", "total"]).rename(columns={"total": "Total"})
             st.write("### 🗓 Weekly Summary")
             st.table(weekly_summary)
             st.bar_chart(weekly_summary.set_index("week"))
 
             st.write("### 📦 Category Breakdown")
-            cat_data = filtered_df.groupby("category")["amount"].sum().reset_index()
+            cat_data = pd.DataFrame(summary["category"], columns=["category", "total"]).rename(columns={"total": "amount"})
             st.bar_chart(cat_data.set_index("category"))
             st.plotly_chart(px.pie(cat_data, names='category', values='amount', title='Category Breakdown'))
 
             st.write("### 📈 Cumulative Expense")
-            filtered_df = filtered_df.sort_values("date")
-            filtered_df["cumulative"] = filtered_df["amount"].cumsum()
-            st.line_chart(filtered_df.set_index("date")["cumulative"])
+            daily = pd.DataFrame(summary["daily"], columns=["date", "cumulative"])
+            daily["date"] = pd.to_datetime(daily["date"])
+            st.line_chart(daily.set_index("date")["cumulative"])
 
             current_month = date.today().strftime("%Y-%m")
             current_month_total = monthly_summary[monthly_summary["month"] == current_month]["Total"].sum()
@@ -195,14 +361,24 @@ elif menu == "View & Analyze":
             if savings < 0:
                 st.error("🚨 You've spent more than your budget. No savings this month.")
 
-            csv = filtered_df.to_csv(index=False).encode("utf-8")
-            st.download_button("📁 Download CSV", csv, "filtered_expenses.csv", "text/csv")
+            # The browser downloads straight from the API's stream. A plain link can't
+            # carry the Authorization header, so a short-lived token is minted on the
+            # click and the download starts at once, before it can expire.
+            if st.button("📁 Export CSV"):
+                try:
+                    link = api_session().post(f"{API_URL}/expenses/export/link", headers=auth_headers(), timeout=10)
+                    link.raise_for_status()
+                except requests.RequestException:
+                    st.error("Export failed.")
+                else:
+                    query = urlencode({**date_filter, "format": "csv", "token": link.json()["token"]})
+                    # The response is an attachment, so loading it in a frame downloads it.
+                    st.iframe(f"{PUBLIC_API_URL}/expenses/export?{query}", height=1)
+                    st.caption("Download started. If nothing arrives, click Export CSV again.")
 
-            # Forecasting call to backend
+            # Forecast fetched alongside the summary
             try:
-                forecast_response = requests.get(f"{API_URL}/expenses/forecast")
-                if forecast_response.status_code == 200:
-                    forecast = forecast_response.json()
+                if forecast:
                     next_month = forecast.get("month")
                     forecast_amount = forecast.get("forecast", 0.0)
 
@@ -247,34 +423,48 @@ elif menu == "View & Analyze":
         st.error("Error fetching expenses.")
 
 elif menu == "Update/Delete":
-    st.subheader("✏️ Update or ❌ Delete Expense")
-    exp_id = st.number_input("Enter Expense ID", min_value=1, step=1)
+    st.subheader("✏️ Update or ❌ Delete Expenses")
+    ids_text = st.text_input("Expense IDs", placeholder="e.g. 12, 15, 31")
+    exp_ids = parse_ids(ids_text)
+    if ids_text and not exp_ids:
+        st.warning("Enter expense IDs as numbers separated by commas or spaces.")
 
     with st.expander("Update"):
+        st.caption("Only the fields you fill in are changed, on every selected expense.")
         new_title = st.text_input("New Title")
         new_amount = st.number_input("New Amount", min_value=0.0)
         new_category = st.text_input("New Category")
-        new_date = st.date_input("New Date", value=date.today())
+        change_date = st.checkbox("Change date")
+        new_date = st.date_input("New Date", value=date.today(), disabled=not change_date)
         if st.button("Update"):
-            if not new_title or not new_category or new_amount <= 0:
-                st.warning("Please fill all fields with valid data before updating.")
+            changes = {}
+            if new_title:
+                changes["title"] = new_title
+            if new_amount > 0:
+                changes["amount"] = new_amount
+            if new_category:
+                changes["category"] = new_category
+            if change_date:
+                changes["date"] = str(new_date)
+            if not exp_ids or not changes:
+                st.warning("Enter expense IDs and at least one field to change.")
             else:
-                payload = {
-                    "title": new_title,
-                    "amount": new_amount,
-                    "category": new_category,
-                    "date": str(new_date)
-                }
-                res = requests.put(f"{API_URL}/expenses/{exp_id}", json=payload)
-                if res.status_code == 200:
-                    st.success("Updated successfully!")
+                res = api_write("PATCH", "/expenses/", {"ids": exp_ids, "set": changes}, "update")
+                if res is not None and res.status_code == 200:
+                    invalidate_cache()
+                    updated = res.json()["updated"]
+                    st.success(f"Updated {updated} of {len(exp_ids)} expenses.")
                 else:
-                    st.error("Update failed. Check ID or data.")
+                    st.error("Update failed. Check IDs or data.")
 
     with st.expander("Delete"):
         if st.button("Delete"):
-            res = requests.delete(f"{API_URL}/expenses/{exp_id}")
-            if res.status_code == 200:
-                st.success("Deleted successfully.")
+            if not exp_ids:
+                st.warning("Enter the expense IDs to delete.")
             else:
-                st.error("Failed to delete. Check ID.")
+                res = api_write("DELETE", "/expenses/", {"ids": exp_ids}, "delete")
+                if res is not None and res.status_code == 200:
+                    invalidate_cache()
+                    st.success(f"Deleted {res.json()['deleted']} of {len(exp_ids)} expenses.")
+                else:
+                    st.error("Failed to delete. Check IDs.")